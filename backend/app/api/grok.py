@@ -1,32 +1,233 @@
+import asyncio
+import contextlib
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import random
 from pathlib import Path
 
+import httpx
+from groq import AsyncGroq, APIConnectionError, APIError, APIStatusError
+from dotenv import load_dotenv
+
+from app.database import llm_cache
+
 env_path = Path(__file__).parent.parent.parent.parent / ".env"
 load_dotenv(env_path)
 
-async def ask_grok(context, question):
-    key = os.getenv("GROK_API_KEY")
-    if not key or key.strip() == "":
-        return "Error: GROK_API_KEY not found in environment variables."
+GROK_MODEL = os.getenv("GROK_MODEL", "llama-3.3-70b-versatile")
+# Any OpenAI-compatible server, e.g. the stub in perf/llm.py
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_USER_CONCURRENCY = int(os.getenv("LLM_USER_CONCURRENCY", "2"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+client = None
+semaphore = None
+user_semaphores = {}
+llm_stats = {"requests": 0, "retries": 0, "failures": 0}
+
+
+class LLMError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+# One client for the whole process so connections are kept alive between
+# calls; retries are handled below, not by the SDK
+def get_client():
+    global client
+    if client is None:
+        key = os.getenv("GROK_API_KEY")
+        if not key or key.strip() == "":
+            raise LLMError(503, "GROK_API_KEY not found in environment variables.")
+        client = AsyncGroq(
+            api_key=key,
+            base_url=GROQ_BASE_URL,
+            max_retries=0,
+            timeout=LLM_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                timeout=LLM_TIMEOUT,
+                limits=httpx.Limits(max_connections=LLM_CONCURRENCY, max_keepalive_connections=LLM_CONCURRENCY)
+            )
+        )
+    return client
+
 
+def get_semaphore():
+    global semaphore
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    return semaphore
+
+
+# Caps calls per user so one user cannot take every global slot. Entries are
+# dropped once nobody holds or waits on them.
+@contextlib.asynccontextmanager
+async def user_slot(user):
+    entry = user_semaphores.get(user)
+    if entry is None:
+        entry = user_semaphores[user] = [asyncio.Semaphore(LLM_USER_CONCURRENCY), 0]
+    entry[1] += 1
     try:
-        client = Groq(api_key=key)
-        prompt = f"""Role: Direct Data Scientist.
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del user_semaphores[user]
+
+
+def retry_delay(attempt, error):
+    # Honor Retry-After when the server sends one, else full jitter backoff
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), LLM_BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def retryable(error):
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, APIConnectionError)
+
+
+def failure(error):
+    llm_stats["failures"] += 1
+    status_code = getattr(error, "status_code", None)
+    return LLMError(429 if status_code == 429 else 503, str(error))
+
+
+# Sends one chat completion and returns the raw answer. Answers are served
+# from llm_cache when the same model and prompt were seen before. 429, 5xx
+# and connection errors are retried; the global slot is released while
+# waiting. Other API errors and empty answers raise LLMError.
+async def complete(prompt, user=None, model=GROK_MODEL, cached=True):
+    key = None
+    if cached and llm_cache.LLM_CACHE_ENABLED:
+        key = llm_cache.cache_key(model, prompt)
+        answer = await llm_cache.get(key)
+        if answer is not None:
+            return answer
+
+    llm_client = get_client()
+    async with user_slot(user):
+        attempt = 0
+        while True:
+            llm_stats["requests"] += 1
+            try:
+                async with get_semaphore():
+                    response = await llm_client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                    )
+                answer = response.choices[0].message.content
+                break
+            except APIError as e:
+                if not retryable(e) or attempt >= LLM_MAX_RETRIES:
+                    raise failure(e) from e
+                delay = retry_delay(attempt, e)
+            attempt += 1
+            llm_stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    if not answer:
+        llm_stats["failures"] += 1
+        raise LLMError(503, "The model returned an empty answer.")
+    if key is not None:
+        await llm_cache.put(key, model, answer)
+    return answer
+
+
+# Streaming variant of complete(): yields the answer in pieces as the model
+# generates them. A cached answer comes back as a single piece. Only errors
+# before the first piece are retried, since the caller has already seen
+# the partial output after that.
+async def stream(prompt, user=None, model=GROK_MODEL, cached=True):
+    key = None
+    if cached and llm_cache.LLM_CACHE_ENABLED:
+        key = llm_cache.cache_key(model, prompt)
+        answer = await llm_cache.get(key)
+        if answer is not None:
+            yield answer
+            return
+
+    llm_client = get_client()
+    parts = []
+    async with user_slot(user):
+        attempt = 0
+        while True:
+            llm_stats["requests"] += 1
+            try:
+                async with get_semaphore():
+                    response = await llm_client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        stream=True,
+                    )
+                    try:
+                        async for chunk in response:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                parts.append(chunk.choices[0].delta.content)
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await response.close()
+                break
+            except APIError as e:
+                if parts or not retryable(e) or attempt >= LLM_MAX_RETRIES:
+                    raise failure(e) from e
+                delay = retry_delay(attempt, e)
+            attempt += 1
+            llm_stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    answer = "".join(parts)
+    if key is not None and answer:
+        await llm_cache.put(key, model, answer)
+
+
+async def close_client():
+    global client, semaphore
+    if client is not None:
+        await client.close()
+    client = None
+    semaphore = None
+    user_semaphores.clear()
+
+
+def build_prompt(context, question):
+    return f"""Role: Direct Data Scientist.
         Task: Answer the Query relying EXCLUSIVELY on the Context.
         Constraint: Zero hallucination. Output RAW JSON ONLY.
         If the answer is absent from the context, reply exactly: "Insufficient context."
         <context> {context}</context>
         <query> {question} </query>
         """
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
-    except Exception as e:
-        error_str = str(e)
-        if "429" in error_str:
+
+
+def strip_fences(answer):
+    return answer.replace("```json", "").replace("```", "").strip()
+
+
+async def ask_grok(context, question, user=None):
+    try:
+        answer = await complete(build_prompt(context, question), user)
+        return strip_fences(answer)
+    except LLMError as e:
+        if e.status_code == 429:
             return "Error: Rate limit reached. Please wait a few minutes and try again."
-        return f"Error: {error_str}"
\ No newline at end of file
+        return f"Error: {e.message}"
+    except Exception as e:
+        # e.g. response validation errors, which the SDK does not wrap
+        return f"Error: {e}"
+
+
+# Raw answer pieces for the same prompt as ask_grok; raises LLMError
+def stream_grok(context, question, user=None):
+    return stream(build_prompt(context, question), user)
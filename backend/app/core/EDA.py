@@ -1,69 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import grok
-from app.db_config import get_database_connection
+from app.db_config import AsyncSessionLocal, get_database_connection
+from app.database import storage
+from app.core import charts
+from app.core import dedup
+from app.core import outliers
+from app.core import sampling
+from app.core import workers
+from app.core import summary as summary_builder
+from app.core.profile import build_charts, load_profile
 from app import models
 
-import io
-import pandas as pd
-import numpy as np
+import asyncio
+import json
+import os
+import traceback
+from typing import List, Literal, Optional
 
 router = APIRouter()
 
+ANALYSIS_LLM_TIMEOUT = float(os.getenv("ANALYSIS_LLM_TIMEOUT", "45"))
+ANALYSIS_CHARTS_TIMEOUT = float(os.getenv("ANALYSIS_CHARTS_TIMEOUT", "60"))
+
+ANALYSIS_QUERY = (
+    "Return ONLY a JSON array. "
+    "Use AT MOST these keys: "
+    "Statistics, Missing Values, Data Types. "
+    "For Statistics: include ONLY count, mean, min, max. "
+    "Do not include explanations. "
+    "Do not nest deeper than column -> metric -> value."
+)
 
-def detect_outliers(dataframe, column):
-    Q1 = dataframe[column].quantile(0.25)
-    Q3 = dataframe[column].quantile(0.75)
 
-    IQR = Q3 - Q1
+# Token-budgeted LLM context for a dataset. Returns the summary text, the
+# stored profile (or the given one, e.g. a sampled profile) and the
+# summary's estimated token count.
+async def get_summary(database, dataset_model, token_budget=summary_builder.SUMMARY_TOKEN_BUDGET, profile=None):
+    if profile is None:
+        profile = await load_profile(database, dataset_model)
 
-    lower_bound = Q1 - (1.5 * IQR)
-    upper_bound = Q3 + (1.5 * IQR)
+    head = None
+    if profile["columns"]:
+        sample_columns = summary_builder.rank_columns(profile)[:summary_builder.SAMPLE_COLUMNS]
+        head, _ = await workers.run_cpu(
+            storage.read_page, storage.ref(dataset_model), 0, summary_builder.SAMPLE_ROWS, sample_columns
+        )
 
-    outlier_rows = dataframe[
-        (dataframe[column] < lower_bound) |
-        (dataframe[column] > upper_bound)
-    ]
+    summary, tokens = summary_builder.build_summary(profile, head, token_budget)
+    return summary, profile, tokens
 
-    outlier_count = len(outlier_rows)
-    return outlier_count
 
-async def get_summary(dataset_model):
+# Awaits one phase of an analysis; on timeout or failure records the reason
+# in `errors` under `name` and returns None. The timeout only bounds the
+# response: a worker job already running finishes in the background and
+# keeps its workers.run_in slot until then.
+async def run_phase(name, awaitable, timeout, errors):
     try:
-        csv_text = dataset_model.content
-        string_buffer = io.StringIO(csv_text)
-        dataframe = pd.read_csv(string_buffer)
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        errors[name] = f"Timed out after {timeout:g} seconds."
+    except HTTPException as e:
+        errors[name] = str(e.detail)
     except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail="Could not parse dataset: " + str(e)
-        )
+        print(f"Analysis phase {name} failed: {e}")
+        print(traceback.format_exc())
+        errors[name] = f"{type(e).__name__}: {e}"
+    return None
 
-    dataset_head = dataframe.head().to_string()
-    dataset_shape = str(dataframe.shape)
-    dataset_stats = dataframe.describe(include="all").to_string()
-    missing_values = dataframe.isnull().sum().to_string()
-    column_types = dataframe.dtypes.to_string()
-
-    summary = (
-        "Dataset head:\n"
-        + dataset_head
-        + "\n\nShape:\n"
-        + dataset_shape
-        + "\n\nStats:\n"
-        + dataset_stats
-        + "\n\nMissing:\n"
-        + missing_values
-        + "\n\nTypes:\n"
-        + column_types
-    )
-    return summary, dataframe
 
+# Charts that are already computed, as an awaitable for run_phase
+async def ready_charts(charts_v):
+    return charts_v
+
+
+# Exact profile and charts for progressive responses, which run after the
+# request's session is closed
+async def exact_charts(dataset_model, scatter_pairs, token_budget=None):
+    async with AsyncSessionLocal() as session:
+        if token_budget is None:
+            profile = await load_profile(session, dataset_model)
+            summary = None
+        else:
+            summary, profile, summary_tokens = await get_summary(session, dataset_model, token_budget)
+    pairs = charts.top_pairs(profile["correlation"], scatter_pairs)
+    charts_v = await workers.run_cpu(build_charts, storage.ref(dataset_model), profile, pairs)
+    if summary is None:
+        return charts_v
+    return charts_v, summary, summary_tokens
+
+# mode=sample builds the charts and the LLM summary from a sample of rows
+# (see app.core.sampling) instead of the exact profile; the response then
+# has a "sample" entry and error margins on the charts. Progressive
+# results need /analyze/stream.
 @router.get("/dataset/{dataset_id}/analyze")
 async def get_analysis(
     dataset_id: int,
+    scatter_pairs: int = Query(charts.SCATTER_TOP_PAIRS, ge=0, le=100),
+    token_budget: int = Query(summary_builder.SUMMARY_TOKEN_BUDGET, ge=200, le=32000),
+    mode: Literal["exact", "sample"] = "exact",
+    sample: dict = Depends(sampling.sample_options),
     db: AsyncSession = Depends(get_database_connection)
 ):
     d1 = await db.execute(
@@ -78,164 +117,218 @@ async def get_analysis(
             detail="Dataset not found"
         )
 
-    summary, dataframe = await get_summary(dataset)
-
-
-    initial = (
-    "Return ONLY a JSON array. "
-    "Use AT MOST these keys: "
-    "Statistics, Missing Values, Data Types. "
-    "For Statistics: include ONLY count, mean, min, max. "
-    "Do not include explanations. "
-    "Do not nest deeper than column -> metric -> value."
-)
-
-    initial_eda = await grok.ask_grok(summary, initial)
-
-    charts = []
+    sampled = None
+    if mode == "sample":
+        sampled = await workers.run_cpu(sampling.sampled_charts, storage.ref(dataset), sample, scatter_pairs)
+        summary, profile, summary_tokens = await get_summary(db, dataset, token_budget, sampled["profile"])
+        # The charts were built along with the sampled profile
+        charts_job = ready_charts(sampled["charts"])
+    else:
+        summary, profile, summary_tokens = await get_summary(db, dataset, token_budget)
+        pairs = charts.top_pairs(profile["correlation"], scatter_pairs)
+        charts_job = workers.run_cpu(build_charts, storage.ref(dataset), profile, pairs)
+
+    # The model call and the chart pipeline are independent, so they run
+    # side by side and a slow or failing LLM still returns the charts
+    errors = {}
+    initial_eda, charts_v = await asyncio.gather(
+        run_phase(
+            "initial_eda",
+            grok.ask_grok(summary, ANALYSIS_QUERY, user=dataset.username),
+            ANALYSIS_LLM_TIMEOUT,
+            errors
+        ),
+        run_phase("charts_v", charts_job, ANALYSIS_CHARTS_TIMEOUT, errors)
+    )
 
-    # Univariate: bar charts for categorical, hist for numeric
-    for column_name in dataframe.columns:
+    if initial_eda is None:
+        initial_eda = "Error: " + errors["initial_eda"]
+    elif initial_eda.startswith("Error:"):
+        errors["initial_eda"] = initial_eda[len("Error:"):].strip()
 
-        column_data = dataframe[column_name]
+    response = {
+        "initial_eda": initial_eda,
+        "charts_v": charts_v if charts_v is not None else [],
+        "summary_tokens": summary_tokens,
+        "errors": errors
+    }
+    if sampled is not None:
+        response["sample"] = sampled["sample"]
+    return response
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Same result as /analyze as server-sent events: "charts" as soon as they
+# are computed, then "token" events while the model writes initial_eda,
+# and "done" with the cleaned full answer. LLM failures arrive as an
+# "error" event after the charts. mode=sample and mode=progressive first
+# send a "sample" event with sampled charts and the sample description;
+# progressive then sends the exact "charts" and summarizes the exact
+# profile, sample mode summarizes the sampled one and sends no "charts".
+@router.get("/dataset/{dataset_id}/analyze/stream")
+async def stream_analysis(
+    dataset_id: int,
+    scatter_pairs: int = Query(charts.SCATTER_TOP_PAIRS, ge=0, le=100),
+    token_budget: int = Query(summary_builder.SUMMARY_TOKEN_BUDGET, ge=200, le=32000),
+    mode: Literal["exact", "sample", "progressive"] = "exact",
+    sample: dict = Depends(sampling.sample_options),
+    db: AsyncSession = Depends(get_database_connection)
+):
+    d1 = await db.execute(
+        select(models.Dataset).where(models.Dataset.id == dataset_id)
+    )
 
-        if pd.api.types.is_numeric_dtype(column_data):
+    dataset = d1.scalar_one_or_none()
 
-            clean_values = column_data.dropna()
+    if dataset is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Dataset not found"
+        )
 
-            histogram_values, bin_edges = np.histogram(
-                clean_values,
-                bins=10
+    dataset_ref = storage.ref(dataset)
+    username = dataset.username
+    summary = summary_tokens = pairs = None
+    if mode == "exact":
+        summary, profile, summary_tokens = await get_summary(db, dataset, token_budget)
+        pairs = charts.top_pairs(profile["correlation"], scatter_pairs)
+
+    async def events():
+        nonlocal summary, summary_tokens
+        errors = {}
+        if mode != "exact":
+            # Started first so it overlaps with the sample on spare workers
+            exact = asyncio.ensure_future(exact_charts(dataset, scatter_pairs, token_budget)) if mode == "progressive" else None
+            sampled = await run_phase(
+                "sample",
+                workers.run_cpu(sampling.sampled_charts, dataset_ref, sample, scatter_pairs),
+                ANALYSIS_CHARTS_TIMEOUT,
+                errors
             )
-
-            labels = []
-            for i in range(len(bin_edges) - 1):
-                left = round(bin_edges[i], 2)
-                right = round(bin_edges[i + 1], 2)
-                labels.append(str(left) + "-" + str(right))
-
-            data_values = []
-            for value in histogram_values:
-                if pd.isna(value) or np.isinf(value):
-                    data_values.append(None)
-                else:
-                    data_values.append(int(value))
-
-            chart_object = {
-                "type": "bar",
-                "title": "Histogram of " + column_name,
-                "labels": labels,
-                "data": data_values
-            }
-
-            charts.append(chart_object)
-
+            if sampled is not None:
+                yield sse_event("sample", {"charts": sampled["charts"], "sample": sampled["sample"]})
+            else:
+                yield sse_event("error", {"phase": "sample", "detail": errors["sample"]})
+
+            if exact is None:
+                if sampled is None:
+                    return
+                summary, _, summary_tokens = await get_summary(None, dataset, token_budget, sampled["profile"])
+            else:
+                # No timeout: the exact result is what the client waits for
+                result = await run_phase("charts", exact, None, errors)
+                if result is None:
+                    yield sse_event("error", {"phase": "charts", "detail": errors["charts"]})
+                    return
+                charts_v, summary, summary_tokens = result
+                yield sse_event("charts", charts_v)
         else:
-            value_counts = column_data.value_counts().head(10)
-
-            labels = value_counts.index.astype(str).tolist()
-            raw_values = value_counts.values.tolist()
-
-            clean_values = []
-            for value in raw_values:
-                if pd.isna(value) or np.isinf(value):
-                    clean_values.append(None)
-                else:
-                    clean_values.append(int(value))
-
-            chart_object = {
-                "type": "bar",
-                "title": "Top categories in " + column_name,
-                "labels": labels,
-                "data": clean_values
-            }
-
-            charts.append(chart_object)
-
-    # Bivariate: scatter for pairs of numeric columns
-    numeric_columns = dataframe.select_dtypes(include=[np.number]).columns.tolist()
-
-    if len(numeric_columns) >= 2:
-
-        for i in range(len(numeric_columns)):
-            for j in range(i + 1, len(numeric_columns)):
-
-                col_x = numeric_columns[i]
-                col_y = numeric_columns[j]
-
-                pair_dataframe = dataframe[[col_x, col_y]].dropna()
-
-                if len(pair_dataframe) > 100:
-                    pair_dataframe = pair_dataframe.sample(
-                        n=100,
-                        random_state=42
-                    )
-
-                scatter_points = []
-
-                for _, row in pair_dataframe.iterrows():
-                    x_value = row[col_x]
-                    y_value = row[col_y]
-
-                    if pd.isna(x_value) or np.isinf(x_value):
-                        x_value = None
-                    else:
-                        x_value = float(x_value)
-
-                    if pd.isna(y_value) or np.isinf(y_value):
-                        y_value = None
-                    else:
-                        y_value = float(y_value)
-
-                    scatter_points.append({
-                        "x": x_value,
-                        "y": y_value
-                    })
-
-                chart_object = {
-                    "type": "scatter",
-                    "title": "Scatter: " + col_x + " vs " + col_y,
-                    "labels": [],
-                    "data": scatter_points
-                }
-
-                charts.append(chart_object)
-
-    # Correlation heatmap for ApexCharts heatmap
-    if len(numeric_columns) >= 2:
+            charts_v = await run_phase(
+                "charts",
+                workers.run_cpu(build_charts, dataset_ref, profile, pairs),
+                ANALYSIS_CHARTS_TIMEOUT,
+                errors
+            )
+            if charts_v is not None:
+                yield sse_event("charts", charts_v)
+            else:
+                yield sse_event("error", {"phase": "charts", "detail": errors["charts"]})
+
+        parts = []
+        try:
+            async for token in grok.stream_grok(summary, ANALYSIS_QUERY, user=username):
+                parts.append(token)
+                yield sse_event("token", token)
+        except grok.LLMError as e:
+            yield sse_event("error", {"phase": "llm", "status_code": e.status_code, "detail": e.message})
+
+        yield sse_event("done", {
+            "initial_eda": grok.strip_fences("".join(parts)),
+            "summary_tokens": summary_tokens
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        correlation_matrix = dataframe[numeric_columns].corr()
 
-        matrix_data = []
+# Outlier bounds, counts and a page of outlier row numbers for every
+# numeric column (or the requested ones), in one vectorized pass.
+# method: "iqr" (quartile fences), "zscore" (mean +- threshold * std) or
+# "mad" (median +- threshold * scaled MAD). Row numbers are 0-based
+# positions as /data pages them; `offset` and `limit` page each column's
+# outliers. Bounds of large streamed datasets come from sketches, so the
+# response marks them approximate.
+@router.get("/dataset/{dataset_id}/outliers")
+async def get_outliers(
+    dataset_id: int,
+    method: Literal["iqr", "zscore", "mad"] = "iqr",
+    threshold: Optional[float] = Query(None, gt=0),
+    columns: Optional[List[str]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=0, le=1000),
+    db: AsyncSession = Depends(get_database_connection)
+):
+    d1 = await db.execute(
+        select(models.Dataset).where(models.Dataset.id == dataset_id)
+    )
 
-        for row_index in range(len(correlation_matrix.columns)):
+    dataset = d1.scalar_one_or_none()
 
-            column_name = correlation_matrix.columns[row_index]
-            row_values = correlation_matrix.iloc[row_index].values.tolist()
+    if dataset is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Dataset not found"
+        )
 
-            clean_row = []
+    profile = await load_profile(db, dataset)
+    numeric = [column for column in profile["columns"] if column["kind"] == "numeric"]
+    if columns:
+        unknown = set(columns) - {column["name"] for column in numeric}
+        if unknown:
+            raise HTTPException(status_code=400, detail="Not numeric columns: " + ", ".join(sorted(unknown)))
+        numeric = [column for column in numeric if column["name"] in columns]
+
+    if threshold is None:
+        threshold = outliers.THRESHOLDS[method]
+    result = await workers.run_cpu(
+        outliers.find_outliers, storage.ref(dataset), numeric, method, threshold, offset, limit
+    )
+    result["row_count"] = profile["row_count"]
+    return result
 
-            for value in row_values:
-                if pd.isna(value) or np.isinf(value):
-                    clean_row.append(None)
-                else:
-                    clean_row.append(float(value))
 
-            matrix_data.append({
-                "name": column_name,
-                "data": clean_row
-            })
+# What dropping duplicates by these settings would remove: counts and the
+# largest duplicate groups with up to `group_rows` of their rows (0-based
+# positions and key values). Rows are hashed batch by batch, so the
+# dataset is never loaded whole; nothing is changed. Apply the same
+# settings with the "dedup" option of /clean.
+@router.get("/dataset/{dataset_id}/duplicates")
+async def get_duplicates(
+    dataset_id: int,
+    columns: Optional[List[str]] = Query(None),
+    mode: Literal["exact", "normalized", "minhash"] = "exact",
+    threshold: float = Query(0.8, gt=0, le=1),
+    groups: int = Query(10, ge=0, le=100),
+    group_rows: int = Query(5, ge=1, le=50),
+    db: AsyncSession = Depends(get_database_connection)
+):
+    d1 = await db.execute(
+        select(models.Dataset).where(models.Dataset.id == dataset_id)
+    )
 
-        chart_object = {
-            "type": "matrix",
-            "title": "Correlation matrix",
-            "labels": correlation_matrix.columns.tolist(),
-            "data": matrix_data
-        }
+    dataset = d1.scalar_one_or_none()
 
-        charts.append(chart_object)
+    if dataset is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Dataset not found"
+        )
 
-    return {
-        "initial_eda": initial_eda,
-        "charts_v": charts
-    }
\ No newline at end of file
+    return await workers.run_cpu(
+        dedup.duplicate_report, storage.ref(dataset), columns, mode, threshold, groups, group_rows
+    )
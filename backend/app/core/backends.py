@@ -0,0 +1,408 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from app.core import charts, infer
+from app.database import storage
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# Engine that runs clean operations and profiling: "pandas" (eager, single
+# threaded) or "polars" (columnar, multithreaded). Picked per deployment;
+# both read and write the same Parquet versions.
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "pandas")
+
+QUANTILES = {"25%": 0.25, "50%": 0.5, "75%": 0.75}
+
+
+# The operations clean.py and the profile builder need. Frames are the
+# engine's own type; to_arrow/from_arrow carry them to the AI code sandbox
+# and to_pandas/from_pandas cross over elsewhere.
+class PandasBackend:
+    name = "pandas"
+
+    # The returned frame may be shared through the cache unless copied
+    def read(self, dataset, columns=None, copy=False):
+        dataframe = storage.read_dataframe(dataset, columns)
+        return dataframe.copy() if copy else dataframe
+
+    def write(self, dataset, dataframe, version=None):
+        return storage.write_version(dataset, dataframe, version)
+
+    def to_pandas(self, dataframe):
+        return dataframe
+
+    def from_pandas(self, dataframe):
+        return dataframe
+
+    def to_arrow(self, dataframe):
+        return storage.to_arrow(dataframe)
+
+    def from_arrow(self, table):
+        return table.to_pandas()
+
+    def infer_types(self, dataframe):
+        return infer.infer_types(dataframe)
+
+    def drop_duplicates(self, dataframe):
+        # Rows that are completely identical across all columns
+        return dataframe.drop_duplicates()
+
+    def fill_missing(self, dataframe):
+        for col in dataframe.columns:
+            if pd.api.types.is_numeric_dtype(dataframe[col]):
+                # Fill missing numbers with 0
+                dataframe[col] = dataframe[col].fillna(0)
+            elif pd.api.types.is_datetime64_any_dtype(dataframe[col]):
+                # Leave missing dates as NaT — filling with 0 would break them
+                pass
+            else:
+                # Fill missing text values with the string "Unknown"
+                dataframe[col] = dataframe[col].fillna("Unknown")
+        return dataframe
+
+    def columns(self, dataframe):
+        return {
+            column_name: (str(dataframe[column_name].dtype), column_kind(dataframe[column_name]))
+            for column_name in dataframe.columns
+        }
+
+    def null_counts(self, dataframe):
+        return {column_name: int(count) for column_name, count in dataframe.isnull().sum().items()}
+
+    # describe(include="all") stats per column, NaN where a stat does not apply
+    def describe(self, dataframe):
+        if not len(dataframe.columns):
+            return {}
+        described = dataframe.describe(include="all")
+        return {column_name: dict(described[column_name].items()) for column_name in described.columns}
+
+    def histograms(self, dataframe, columns):
+        return charts.histograms(dataframe[columns])
+
+    def value_counts(self, dataframe, column_name, limit=charts.TOP_CATEGORIES):
+        return charts.top_categories(dataframe[column_name], limit)
+
+    def correlation(self, dataframe, columns):
+        return charts.correlation(dataframe[columns])
+
+    def head(self, dataframe, rows=5):
+        return dataframe.head(rows)
+
+    # Numeric columns as one float matrix, missing values as NaN
+    def numeric_values(self, dataframe, columns):
+        return dataframe[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def clip(self, dataframe, columns, lower, upper):
+        for position, name in enumerate(columns):
+            integer = pd.api.types.is_integer_dtype(dataframe[name])
+            low, high = clip_bounds(lower[position], upper[position], integer)
+            dataframe[name] = dataframe[name].clip(low, high)
+        return dataframe
+
+    def drop_rows(self, dataframe, mask):
+        return dataframe[~mask]
+
+    # Columns as a pandas frame, for hashing rows
+    def key_frame(self, dataframe, columns):
+        return dataframe[columns]
+
+
+def column_kind(column_data):
+    if pd.api.types.is_bool_dtype(column_data):
+        return "categorical"
+    if pd.api.types.is_numeric_dtype(column_data):
+        return "numeric"
+    return "categorical"
+
+
+# Profiles keep pandas dtype names whichever engine built them, so version
+# diffs and the LLM summary read the same either way
+def polars_dtype_name(dtype):
+    if dtype == pl.String:
+        return "object"
+    if dtype == pl.Boolean:
+        return "bool"
+    if isinstance(dtype, pl.Datetime):
+        return f"datetime64[{dtype.time_unit}]" if dtype.time_zone is None else f"datetime64[{dtype.time_unit}, {dtype.time_zone}]"
+    return str(dtype).lower()
+
+
+def polars_kind(dtype):
+    return "numeric" if dtype.is_numeric() else "categorical"
+
+
+# Bounds clip() takes: None where a bound is undefined, and rounded inwards
+# for integer columns so clipped values keep the column's dtype
+def clip_bounds(low, high, integer):
+    if not (np.isfinite(low) and np.isfinite(high)):
+        return None, None
+    if integer and np.ceil(low) <= np.floor(high):
+        return int(np.ceil(low)), int(np.floor(high))
+    if integer:
+        return int(np.floor(low)), int(np.ceil(high))
+    return float(low), float(high)
+
+
+class PolarsBackend:
+    name = "polars"
+
+    # Polars frames are immutable, so the cache is left to the pandas
+    # readers and every read goes to Parquet (multithreaded)
+    def read(self, dataset, columns=None, copy=False):
+        if not dataset.storage_path:
+            return pl.from_arrow(storage.to_arrow(storage.read_dataframe(dataset, columns)))
+        try:
+            return pl.read_parquet(dataset.storage_path, columns=columns)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail="Could not parse dataset: " + str(e))
+
+    def write(self, dataset, dataframe, version=None):
+        return storage.write_table(dataset, dataframe.to_arrow(), version)
+
+    def to_pandas(self, dataframe):
+        return dataframe.to_pandas()
+
+    def from_pandas(self, dataframe):
+        # Same stringification of mixed object columns as the Parquet writer
+        return pl.from_arrow(storage.to_arrow(dataframe))
+
+    # Polars frames are Arrow memory, so both directions are zero-copy
+    def to_arrow(self, dataframe):
+        return dataframe.to_arrow()
+
+    def from_arrow(self, table):
+        return pl.from_arrow(table)
+
+    # Same decisions as infer.infer_types (taken on the same stratified
+    # sample, converted to pandas), applied as Polars expressions so all
+    # columns convert in parallel
+    def infer_types(self, dataframe):
+        positions = infer.sample_positions(dataframe.height)
+        sample = dataframe.select(pl.all().gather(positions)).to_pandas()
+
+        rules = {}
+        report = []
+        for name, dtype in dataframe.schema.items():
+            entry = {"column": name, "from": polars_dtype_name(dtype), "to": polars_dtype_name(dtype),
+                     "rule": "kept", "match_ratio": None, "sample_size": int(len(positions))}
+            report.append(entry)
+            if dtype != pl.String:
+                continue
+
+            rule, match_ratio = infer.decide(name, sample[name])
+            if rule == "boolean" and not self.is_boolean(dataframe[name]):
+                # The sample only showed two boolean words; the full column has more
+                rule, match_ratio = infer.decide(name, sample[name], allow_boolean=False)
+            rules[name] = rule
+            entry["rule"] = rule
+            entry["match_ratio"] = round(match_ratio, 4)
+
+        dataframe = self.convert(dataframe, rules)
+        for entry in report:
+            entry["to"] = polars_dtype_name(dataframe.schema[entry["column"]])
+        return dataframe, report
+
+    def is_boolean(self, column):
+        uniques = column.drop_nulls().str.to_lowercase().unique()
+        return 0 < len(uniques) <= 2 and uniques.is_in(list(infer.BOOL_MAP)).all()
+
+    def convert(self, dataframe, rules):
+        texts = {}
+        for name, rule in rules.items():
+            text = pl.col(name)
+            if rule == "numeric":
+                text = text.str.replace_all(",", "", literal=True).str.strip_chars()
+            elif rule == "percent":
+                text = text.str.replace_all("%", "", literal=True).str.strip_chars()
+            elif rule == "currency":
+                for symbol in infer.CURRENCY_SYMBOLS:
+                    text = text.str.replace_all(symbol, "", literal=True)
+                text = text.str.strip_chars()
+            elif rule == "text":
+                text = text.str.strip_chars()
+            else:
+                continue
+            texts[name] = text
+
+        # Whole columns of plain integers stay integers, like pd.to_numeric
+        numeric = [name for name, rule in rules.items() if rule in ("numeric", "percent", "currency")]
+        integers = set()
+        if numeric:
+            flags = dataframe.select([
+                (texts[name].str.contains(infer.INTEGER_PATTERN).all(ignore_nulls=False)
+                 & texts[name].cast(pl.Int64, strict=False).is_not_null().all()).alias(name)
+                for name in numeric
+            ]).row(0, named=True)
+            integers = {name for name, flag in flags.items() if flag}
+
+        expressions = []
+        for name, rule in rules.items():
+            if rule == "boolean":
+                lowered = pl.col(name).str.to_lowercase()
+                expressions.append(
+                    pl.when(lowered.is_null()).then(None)
+                    .otherwise(lowered.is_in([word for word, value in infer.BOOL_MAP.items() if value]))
+                    .alias(name)
+                )
+            elif rule == "text":
+                expressions.append(texts[name].alias(name))
+            elif name in integers:
+                expressions.append(texts[name].cast(pl.Int64).alias(name))
+            elif rule != "datetime":
+                # Numbers the way float() reads them; anything else becomes null
+                valid = texts[name].str.contains(infer.NUMBER_PATTERN)
+                expressions.append(pl.when(valid).then(texts[name]).cast(pl.Float64, strict=False).alias(name))
+        if expressions:
+            dataframe = dataframe.with_columns(expressions)
+
+        for name, rule in rules.items():
+            if rule == "datetime":
+                dataframe = dataframe.with_columns(self.to_datetime(dataframe[name]))
+        return dataframe
+
+    def to_datetime(self, column):
+        try:
+            return column.str.to_datetime(strict=False, time_unit="ns")
+        except pl.exceptions.PolarsError:
+            # Formats Polars cannot infer go through pandas' parser
+            return pl.from_pandas(pd.to_datetime(column.to_pandas(), errors="coerce")).alias(column.name)
+
+    def drop_duplicates(self, dataframe):
+        return dataframe.unique(keep="first", maintain_order=True)
+
+    def fill_missing(self, dataframe):
+        expressions = []
+        for name, dtype in dataframe.schema.items():
+            column = pl.col(name)
+            if dtype.is_float():
+                expressions.append(column.fill_nan(0).fill_null(0))
+            elif dtype.is_numeric():
+                expressions.append(column.fill_null(0))
+            elif dtype == pl.String:
+                expressions.append(column.fill_null("Unknown"))
+            elif dtype == pl.Boolean and dataframe[name].null_count():
+                # pandas keeps True/False next to "Unknown" in an object
+                # column, which is stored as text
+                expressions.append(
+                    pl.when(column.is_null()).then(pl.lit("Unknown"))
+                    .when(column).then(pl.lit("True")).otherwise(pl.lit("False"))
+                    .alias(name)
+                )
+        return dataframe.with_columns(expressions) if expressions else dataframe
+
+    def columns(self, dataframe):
+        return {name: (polars_dtype_name(dtype), polars_kind(dtype)) for name, dtype in dataframe.schema.items()}
+
+    # Float NaN counts as missing, as it does for pandas
+    def null_counts(self, dataframe):
+        if not dataframe.width:
+            return {}
+        counts = dataframe.select([
+            (pl.col(name).is_null() | pl.col(name).is_nan()).sum().alias(name) if dtype.is_float()
+            else pl.col(name).null_count().alias(name)
+            for name, dtype in dataframe.schema.items()
+        ])
+        return {name: int(count) for name, count in counts.row(0, named=True).items()}
+
+    # The describe(include="all") stats pandas reports, computed in one
+    # parallel select
+    def describe(self, dataframe):
+        expressions = []
+        for name, dtype in dataframe.schema.items():
+            column = pl.col(name)
+            if dtype.is_numeric():
+                values = column.cast(pl.Float64).fill_nan(None)
+                stats = {
+                    "count": values.count().cast(pl.Float64),
+                    "mean": values.mean(),
+                    "std": values.std(),
+                    "min": values.min(),
+                    **{key: values.quantile(q, interpolation="linear") for key, q in QUANTILES.items()},
+                    "max": values.max()
+                }
+            elif dtype.is_temporal():
+                stats = {
+                    "count": column.count(),
+                    "mean": column.mean(),
+                    "min": column.min(),
+                    # Quantiles of the underlying integers, as pandas takes them
+                    **{
+                        key: column.to_physical().quantile(q, interpolation="linear").cast(pl.Int64).cast(dtype)
+                        for key, q in QUANTILES.items()
+                    },
+                    "max": column.max()
+                }
+            else:
+                top = column.drop_nulls().value_counts(sort=True, name="freq").first()
+                stats = {
+                    "count": column.count(),
+                    "unique": column.drop_nulls().n_unique(),
+                    "top": top.struct.field(name),
+                    "freq": top.struct.field("freq")
+                }
+            expressions.extend(expression.alias(f"{name}\x00{stat}") for stat, expression in stats.items())
+
+        if not expressions:
+            return {}
+        described = {name: {} for name in dataframe.columns}
+        for key, value in dataframe.select(expressions).row(0, named=True).items():
+            name, stat = key.split("\x00")
+            described[name][stat] = value
+        return described
+
+    def numeric_frame(self, dataframe, columns):
+        if not columns:
+            return pd.DataFrame()
+        values = dataframe.select(pl.col(columns).cast(pl.Float64).fill_nan(None)).to_numpy()
+        return pd.DataFrame(values, columns=columns)
+
+    def histograms(self, dataframe, columns):
+        return charts.histograms(self.numeric_frame(dataframe, columns))
+
+    def value_counts(self, dataframe, column_name, limit=charts.TOP_CATEGORIES):
+        counts = dataframe[column_name].drop_nulls().value_counts(sort=True, name="count").head(limit)
+        # Labels formatted by pandas, like the pandas backend's
+        labels = pd.Index(counts[column_name].to_pandas()).astype(str).tolist()
+        return labels, counts["count"].to_list()
+
+    def correlation(self, dataframe, columns):
+        return charts.correlation(self.numeric_frame(dataframe, columns))
+
+    def head(self, dataframe, rows=5):
+        return dataframe.head(rows).to_pandas()
+
+    def numeric_values(self, dataframe, columns):
+        return dataframe.select(pl.col(columns).cast(pl.Float64).fill_null(np.nan)).to_numpy()
+
+    def clip(self, dataframe, columns, lower, upper):
+        expressions = []
+        for position, name in enumerate(columns):
+            low, high = clip_bounds(lower[position], upper[position], dataframe.schema[name].is_integer())
+            expressions.append(pl.col(name).clip(low, high))
+        return dataframe.with_columns(expressions)
+
+    def drop_rows(self, dataframe, mask):
+        return dataframe.filter(pl.Series(~mask))
+
+    def key_frame(self, dataframe, columns):
+        return dataframe.select(columns).to_pandas()
+
+
+BACKENDS = {"pandas": PandasBackend, "polars": PolarsBackend}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise RuntimeError(f"Unknown EXECUTION_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name == "polars" and pl is None:
+        raise RuntimeError("EXECUTION_BACKEND=polars needs the polars package")
+    return BACKENDS[name]()
+
+
+backend = get_backend(EXECUTION_BACKEND)
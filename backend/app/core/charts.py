@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+
+HISTOGRAM_BINS = 10
+TOP_CATEGORIES = 10
+SCATTER_POINTS = 100
+HISTOGRAM_BLOCK_ROWS = 16384
+SCATTER_TOP_PAIRS = int(os.getenv("SCATTER_TOP_PAIRS", "10"))
+
+
+def finite_or_none(values):
+    # NaN and +-inf are not valid JSON, send them as null
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+# Histograms for every column of a numeric frame at once. Bin edges and
+# bin assignment follow np.histogram exactly (equal-width bins, last bin
+# closed, constant columns widened by 0.5), but all columns are binned
+# together and counted with one bincount per block of rows. Non-finite
+# values are ignored.
+def histograms(dataframe, bins=HISTOGRAM_BINS):
+    column_count = dataframe.shape[1]
+    if column_count == 0:
+        return {}
+    values = dataframe.to_numpy(dtype=float, na_value=np.nan)
+
+    finite = np.isfinite(values)
+    has_values = finite.any(axis=0)
+    lows = np.where(has_values, np.where(finite, values, np.inf).min(axis=0, initial=np.inf), 0.0)
+    highs = np.where(has_values, np.where(finite, values, -np.inf).max(axis=0, initial=-np.inf), 1.0)
+    lows, highs = histogram_range(lows, highs)
+
+    counts, edges = bin_counts(values, lows, highs, bins)
+    return {
+        name: (counts[position], edges[position])
+        for position, name in enumerate(dataframe.columns)
+    }
+
+
+def histogram_range(lows, highs):
+    constant = lows == highs
+    return np.where(constant, lows - 0.5, lows), np.where(constant, highs + 0.5, highs)
+
+
+# Counts of a float matrix per column into `bins` equal-width bins between
+# lows and highs; returns (counts, edges) with one row per column. Batches
+# of one dataset binned with the same ranges can be summed.
+def bin_counts(values, lows, highs, bins=HISTOGRAM_BINS):
+    column_count = values.shape[1]
+    finite = np.isfinite(values)
+    spans = highs - lows
+
+    edges = np.linspace(lows, highs, bins + 1, axis=1)
+    flat_edges = edges.ravel()
+    edge_base = np.arange(column_count) * (bins + 1)
+    count_base = np.arange(column_count) * bins
+
+    counts = np.zeros(column_count * bins + 1, dtype=np.int64)
+    for start in range(0, len(values), HISTOGRAM_BLOCK_ROWS):
+        block = values[start:start + HISTOGRAM_BLOCK_ROWS]
+        block_finite = finite[start:start + HISTOGRAM_BLOCK_ROWS]
+
+        with np.errstate(invalid="ignore"):
+            indices = (block - lows) / spans * bins
+        indices = np.where(block_finite, indices, 0).astype(np.intp)
+        np.minimum(indices, bins - 1, out=indices)
+
+        # Same floating point corrections np.histogram applies at bin edges
+        indices -= block < flat_edges[edge_base + indices]
+        indices += (block >= flat_edges[edge_base + indices + 1]) & (indices != bins - 1)
+
+        # Missing values go to one spare slot past the last bin
+        slots = np.where(block_finite, indices + count_base, column_count * bins)
+        counts += np.bincount(slots.ravel(), minlength=column_count * bins + 1)
+
+    return counts[:-1].reshape(column_count, bins), edges
+
+
+def correlation(dataframe):
+    values = dataframe.to_numpy(dtype=float, na_value=np.nan)
+    if np.isfinite(values).all() and len(values) > 1:
+        # BLAS path; pairwise-complete pandas corr is only needed with gaps
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = np.corrcoef(values, rowvar=False)
+    else:
+        matrix = dataframe.corr().to_numpy()
+    return [str(label) for label in dataframe.columns], matrix
+
+
+def top_categories(column_data, limit=TOP_CATEGORIES):
+    value_counts = column_data.value_counts().head(limit)
+    return value_counts.index.astype(str).tolist(), value_counts.to_numpy().tolist()
+
+
+# Charts of sampled profiles carry an "error" entry: the 95% margin of
+# each estimated bar, or the interval of each correlation
+def with_error(chart, error):
+    if error is not None:
+        chart["error"] = error
+    return chart
+
+
+def histogram_chart(column_name, counts, edges, error=None):
+    rounded = np.round(np.asarray(edges, dtype=float), 2).astype(str)
+    labels = np.char.add(np.char.add(rounded[:-1], "-"), rounded[1:]).tolist()
+    return with_error({
+        "type": "bar",
+        "title": "Histogram of " + column_name,
+        "labels": labels,
+        "data": np.asarray(counts, dtype=np.int64).tolist()
+    }, error)
+
+
+def category_chart(column_name, labels, counts, error=None):
+    return with_error({
+        "type": "bar",
+        "title": "Top categories in " + column_name,
+        "labels": labels,
+        "data": np.asarray(counts, dtype=np.int64).tolist()
+    }, error)
+
+
+def scatter_chart(col_x, col_y, xs, ys):
+    xs = finite_or_none(xs)
+    ys = finite_or_none(ys)
+    return {
+        "type": "scatter",
+        "title": "Scatter: " + col_x + " vs " + col_y,
+        "labels": [],
+        "data": [{"x": x, "y": y} for x, y in zip(xs, ys)]
+    }
+
+
+# Scatter charts for column pairs of a numeric frame (all pairs by default).
+# Instead of dropna + sample per pair, rows are shuffled once and each pair
+# takes the first rows where both values are present, which is a uniform
+# sample without copying the pair out of the frame.
+def scatter_charts(dataframe, pairs=None, sample_size=SCATTER_POINTS):
+    names = dataframe.columns.tolist()
+    if pairs is None:
+        pairs = [(names[i], names[j]) for i in range(len(names)) for j in range(i + 1, len(names))]
+    if not pairs:
+        return []
+
+    values = dataframe.to_numpy(dtype=float, na_value=np.nan)
+    present = ~np.isnan(values)
+    order = np.random.RandomState(42).permutation(len(values))
+    head = order[:sample_size * 4]
+    positions = {name: position for position, name in enumerate(names)}
+
+    result = []
+    for col_x, col_y in pairs:
+        x, y = positions[col_x], positions[col_y]
+        picked = head[present[head, x] & present[head, y]][:sample_size]
+        if len(picked) < sample_size and len(head) < len(order):
+            picked = order[present[order, x] & present[order, y]][:sample_size]
+        picked = np.sort(picked)
+        result.append(scatter_chart(col_x, col_y, values[picked, x], values[picked, y]))
+    return result
+
+
+# The `limit` most informative numeric pairs, ranked by |correlation|.
+# Pairs without a defined correlation come last.
+def top_pairs(correlation_data, limit=SCATTER_TOP_PAIRS):
+    if correlation_data is None or limit <= 0:
+        return []
+
+    labels = correlation_data["labels"]
+    matrix = np.abs(np.asarray(correlation_data["matrix"], dtype=float))
+    rows, columns = np.triu_indices(len(labels), k=1)
+    scores = np.nan_to_num(matrix[rows, columns], nan=-1.0)
+    best = np.argsort(-scores, kind="stable")[:limit]
+    return [(labels[rows[i]], labels[columns[i]]) for i in best]
+
+
+def correlation_chart(labels, matrix, digits=3, low=None, high=None):
+    rounded = np.round(np.asarray(matrix, dtype=float), digits)
+    rows = finite_or_none(rounded)
+    error = None
+    if low is not None:
+        error = [{"name": name, "low": low_row, "high": high_row} for name, low_row, high_row in zip(labels, low, high)]
+    return with_error({
+        "type": "matrix",
+        "title": "Correlation matrix",
+        "labels": labels,
+        "data": [{"name": name, "data": row} for name, row in zip(labels, rows)]
+    }, error)
+
+
+# Chart list shared by /analyze and /visualize. Univariate charts and the
+# correlation matrix come from the stored profile; scatter charts are only
+# built for `pairs`, whose columns must be in `dataframe`.
+def profile_charts(profile, dataframe, pairs):
+    charts = []
+
+    for column in profile["columns"]:
+        if column["kind"] == "numeric":
+            if column["null_count"] == profile["row_count"]:
+                continue
+            histogram = column["histogram"]
+            charts.append(histogram_chart(
+                column["name"], histogram["counts"], histogram["edges"], histogram.get("error")
+            ))
+        elif column["top_values"]["labels"]:
+            top_values = column["top_values"]
+            charts.append(category_chart(
+                column["name"], top_values["labels"], top_values["counts"], top_values.get("error")
+            ))
+
+    charts.extend(scatter_charts(dataframe, pairs))
+
+    if profile["correlation"] is not None:
+        correlation_data = profile["correlation"]
+        charts.append(correlation_chart(
+            correlation_data["labels"], correlation_data["matrix"],
+            low=correlation_data.get("low"), high=correlation_data.get("high")
+        ))
+
+    return charts
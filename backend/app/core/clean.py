@@ -1,32 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
-from typing import List
-from groq import Groq
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 from app.api import grok
 from app.db_config import get_database_connection
+from app.database import storage
 from app import models
 from app.core.EDA import get_summary
+from app.core import workers
+from app.core.backends import backend
+from app.core import versions
+from app.core.operations import BUILTIN_OPERATIONS, apply_operations
+from app.core.profile import build_profile, save_profile
 
-import io
-import os
 import re
-import pandas as pd
 import numpy as np
 import json
 
 router = APIRouter()
 
 
+# Caps numeric columns at their outlier bounds or removes rows outside
+# them; see app.core.outliers for the methods and default thresholds
+class OutlierTreatment(BaseModel):
+    action: Literal["cap", "remove"]
+    method: Literal["iqr", "zscore", "mad"] = "iqr"
+    threshold: Optional[float] = Field(None, gt=0)
+    columns: Optional[List[str]] = None
+
+
+# Drops duplicate rows by key columns (all by default). "normalized"
+# compares text ignoring case, punctuation and spacing; "minhash" finds
+# near-duplicate text with an estimated similarity of at least threshold.
+# GET /duplicates shows what a setting would remove.
+class Deduplication(BaseModel):
+    columns: Optional[List[str]] = None
+    mode: Literal["exact", "normalized", "minhash"] = "exact"
+    threshold: float = Field(0.8, gt=0, le=1)
+
+
 class CleanRequest(BaseModel):
     operations: List[str]
+    outliers: Optional[OutlierTreatment] = None
+    dedup: Optional[Deduplication] = None
 
 
 @router.get("/dataset/{dataset_id}/data")
 async def columns_and_rows(
     dataset_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=1000),
+    columns: Optional[List[str]] = Query(None),
+    sort: Optional[str] = None,
+    descending: bool = False,
     database: AsyncSession = Depends(get_database_connection)
 ):
     d1 = await database.execute(
@@ -36,12 +65,17 @@ async def columns_and_rows(
     dataset = d1.scalar_one_or_none()
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    df = pd.read_csv(io.StringIO(dataset.content))
 
-    fivegrid = df.iloc[:20, :5].replace({np.nan: None})
+    page, total_rows = await workers.run_cpu(
+        storage.read_page, storage.ref(dataset), offset, limit, columns, sort, descending
+    )
+    page = page.replace({np.nan: None})
     response = {
-        "columns": fivegrid.columns.tolist(),
-        "rows": fivegrid.values.tolist()
+        "columns": page.columns.tolist(),
+        "rows": page.values.tolist(),
+        "offset": offset,
+        "limit": limit,
+        "total_rows": total_rows
     }
     return response
 
@@ -58,9 +92,7 @@ async def suggestions(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    summary, dataset = await get_summary(dataset)
-
-    client = Groq(api_key=os.getenv("GROK_API_KEY"))
+    summary, profile, summary_tokens = await get_summary(database, dataset)
 
     prompt = (
         f"Here is a summary of a dataset:\n{summary}\n\n"
@@ -70,16 +102,12 @@ async def suggestions(
     )
 
     try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        answer = response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
-    except Exception as e:
-        error_str = str(e)
-        if "429" in error_str:
+        answer = await grok.complete(prompt, user=dataset.username)
+        answer = answer.replace("```json", "").replace("```", "").strip()
+    except grok.LLMError as e:
+        if e.status_code == 429:
             raise HTTPException(status_code=429, detail="AI rate limit reached. Please wait a few minutes and try again.")
-        raise HTTPException(status_code=503, detail=f"AI service error: {error_str}")
+        raise HTTPException(status_code=503, detail=f"AI service error: {e.message}")
 
     try:
         cleaned = re.sub(r"```(?:json)?|```", "", answer).strip()
@@ -90,6 +118,17 @@ async def suggestions(
     return {"suggestions": suggestions_json}
 
 
+# Runs on a compute worker: applies the operations to a copy of the stored
+# frame, writes the result as `version` and profiles it
+def clean_frame(dataset, operations, code=None, version=None, outliers=None, dedup=None):
+    # Copy so in-place edits never leak into the shared DataFrame cache
+    df = backend.read(dataset, copy=True)
+    df, report = apply_operations(df, operations, code, outliers, dedup)
+
+    written = backend.write(dataset, df, version)
+    return written, build_profile(df), report
+
+
 @router.post("/dataset/{dataset_id}/clean")
 async def clean_dataset(
     dataset_id: int,
@@ -104,120 +143,55 @@ async def clean_dataset(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    df = pd.read_csv(io.StringIO(dataset.content))
-
-    if "item1" in body.operations:
-        for col in df.columns:
-
-            # Skip columns that are already a proper numeric or datetime type
-            if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
-                continue
-
-            col_lower = col.lower()
-            sample = df[col].dropna().astype(str)
-
-            # If the column name contains date/time words, try converting it to datetime
-            date_keywords = ["date", "time", "year", "month", "day", "created", "updated", "timestamp", "born", "founded"]
-            looks_like_date_column = any(word in col_lower for word in date_keywords)
-
-            if looks_like_date_column:
-                converted = pd.to_datetime(df[col], errors='coerce')
-                # Only apply if at least half the values converted successfully
-                if converted.notna().mean() >= 0.5:
-                    df[col] = converted
-                    continue
-
-            # Check if the values look like booleans (yes/no, true/false, 1/0)
-            bool_map = {"true": True, "false": False, "yes": True, "no": False, "1": True, "0": False}
-            unique_vals = sample.str.lower().unique()
-            looks_like_bool = all(v in bool_map for v in unique_vals)
-
-            if looks_like_bool and len(unique_vals) <= 2:
-                # Convert the column to actual True/False boolean values
-                df[col] = sample.str.lower().map(bool_map)
-                continue
-
-            # Check if the values are mostly numeric (strip spaces, dots, dashes)
-            def looks_numeric(val):
-                cleaned = str(val).strip().replace(',', '').replace(' ', '')
-                try:
-                    float(cleaned)
-                    return True
-                except ValueError:
-                    return False
-
-            numeric_ratio = sample.apply(looks_numeric).mean()
-
-            if numeric_ratio >= 0.7:
-                # Convert to numeric, turning anything that fails into NaN
-                converted = pd.to_numeric(df[col].astype(str).str.replace(',', '').str.strip(), errors='coerce')
-                df[col] = converted
-                continue
-
-            # Check if it looks like a percentage column (e.g. "45%")
-            percent_ratio = sample.str.strip().str.endswith('%').mean()
-
-            if percent_ratio >= 0.7:
-                # Strip the % sign and convert to a float between 0 and 100
-                df[col] = pd.to_numeric(sample.str.replace('%', '').str.strip(), errors='coerce')
-                continue
-
-            # Check if it looks like a currency column (e.g. "$1,200.00")
-            currency_ratio = sample.str.strip().str.match(r'^[\$\€\£\¥]?[\d,]+\.?\d*$').mean()
-
-            if currency_ratio >= 0.7:
-                # Strip currency symbols and commas, then convert to float
-                df[col] = pd.to_numeric(
-                    sample.str.replace(r'[\$\€\£\¥,]', '', regex=True).str.strip(),
-                    errors='coerce'
-                )
-                continue
-
-            # If nothing matched, it's a plain text column — just clean up extra whitespace
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.strip()
-
-    if "item2" in body.operations:
-        # Remove rows that are completely identical across all columns
-        df = df.drop_duplicates()
-
-    if "item3" in body.operations:
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                # Fill missing numbers with 0
-                df[col] = df[col].fillna(0)
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                # Leave missing dates as NaT — filling with 0 would break them
-                pass
-            else:
-                # Fill missing text values with the string "Unknown"
-                df[col] = df[col].fillna("Unknown")
-
-    ai_ops = [op for op in body.operations if op not in ("item1", "item2", "item3")]
+    ai_ops = [op for op in body.operations if op not in BUILTIN_OPERATIONS]
 
+    # The built-in operations never rename columns, so the prompt can use
+    # the stored column names and the code runs after them in the worker
+    code = None
     if ai_ops:
+        columns = await workers.run_cpu(storage.column_names, storage.ref(dataset))
         prompt = (
-            f"You have a pandas DataFrame named 'df' with these columns: {df.columns.tolist()}\n"
+            f"You have a pandas DataFrame named 'df' with these columns: {columns}\n"
             "Apply these cleaning operations:\n"
             + "\n".join(f"- {op}" for op in ai_ops) +
             "\nReturn ONLY executable Python code that modifies 'df'. No imports, no explanations, no markdown."
         )
 
-        code = await grok.ask_grok("", prompt)
+        code = await grok.ask_grok("", prompt, user=dataset.username)
 
         if code.startswith("Error:"):
             raise HTTPException(status_code=503, detail=code)
 
         code = re.sub(r"```(?:python)?|```", "", code).strip()
 
-        try:
-            local_vars = {"df": df, "pd": pd, "np": np}
-            exec(code, local_vars)
-            df = local_vars["df"]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error applying AI suggestions: {str(e)}")
-
-    dataset.content = df.to_csv(index=False)
-    await database.commit()
+    outliers = body.outliers.model_dump() if body.outliers else None
+    dedup = body.dedup.model_dump() if body.dedup else None
+    await versions.store_text_base(database, dataset)
+    rows = await versions.load_versions(database, dataset)
+    written, profile, report = await workers.run_cpu(
+        clean_frame, storage.ref(dataset), body.operations, code, versions.next_version(rows), outliers, dedup
+    )
 
-    return {"message": "Dataset cleaned successfully"}
\ No newline at end of file
+    parent_version = dataset.version
+    try:
+        storage.apply_version(dataset, written)
+        versions.add_version(database, dataset, rows, parent_version, body.operations, code, outliers, dedup)
+        await save_profile(database, dataset, profile)
+        removed_files = await versions.compact(database, dataset, rows)
+        await database.commit()
+    except IntegrityError:
+        # Another clean of this dataset committed the same version number
+        # first; its row and file stay, this request's file goes
+        await database.rollback()
+        storage.remove_file(written["storage_path"])
+        raise HTTPException(status_code=409, detail="Dataset was changed by another request, try again")
+    except Exception:
+        await database.rollback()
+        storage.remove_file(written["storage_path"])
+        raise
+    for path in removed_files:
+        storage.remove_file(path)
+
+    response = {"message": "Dataset cleaned successfully", "version": dataset.version}
+    response.update(report)
+    return response
\ No newline at end of file
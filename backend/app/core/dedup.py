@@ -0,0 +1,210 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from app.core import streaming
+from app.core.backends import backend
+from app.database import storage
+from app.database.cache import dataframe_cache
+
+# Rows hashed at a time when the frame is already in memory
+DEDUP_CHUNK_ROWS = 65536
+# MinHash signature: BANDS bands of BAND_ROWS hashes. Rows whose band
+# agrees in any band become candidates; with 8 x 4 rows sharing 60% of
+# their shingles are found about half the time, 80% almost always.
+BANDS = 8
+BAND_ROWS = 4
+SHINGLE_CHARS = 3
+MINHASH_PRIME = 4294967311  # first prime above 2**32
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def check_columns(names, columns):
+    unknown = [column for column in columns or [] if column not in names]
+    if unknown:
+        raise HTTPException(status_code=400, detail="Unknown columns: " + ", ".join(unknown))
+    return list(columns) if columns else list(names)
+
+
+# Text compared the way a person would: case, accents' composed forms,
+# punctuation and runs of whitespace are ignored
+def normalize_text(values):
+    text = values.astype("string").str.normalize("NFKC").str.lower()
+    text = text.str.replace(PUNCTUATION, "", regex=True).str.replace(WHITESPACE, " ", regex=True).str.strip()
+    return text.astype(object).where(values.notna(), None)
+
+
+def normalized(frame):
+    frame = frame.copy()
+    for name in frame.columns:
+        if frame[name].dtype == object or pd.api.types.is_string_dtype(frame[name]):
+            frame[name] = normalize_text(frame[name])
+    return frame
+
+
+# One 64-bit hash per row of the key columns. Equal rows, missing values
+# included, hash equal; a collision between different rows is about as
+# likely as n**2 / 2**65.
+def row_hashes(frame, mode):
+    if mode == "normalized":
+        frame = normalized(frame)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def permutations(count):
+    rng = np.random.default_rng(7)
+    return (
+        rng.integers(1, MINHASH_PRIME, count, dtype=np.uint64),
+        rng.integers(0, MINHASH_PRIME, count, dtype=np.uint64)
+    )
+
+
+# MinHash signatures of the rows' normalized text (key columns joined),
+# over character shingles. All shingles of the chunk are hashed at once
+# and each permutation's minimum is taken per row with reduceat.
+def signatures(frame):
+    texts = normalized(frame).fillna("").astype(str).agg(" ".join, axis=1).to_numpy()
+    shingles = [
+        [text[i:i + SHINGLE_CHARS] for i in range(max(1, len(text) - SHINGLE_CHARS + 1))]
+        for text in texts
+    ]
+    sizes = np.fromiter((len(row) for row in shingles), dtype=np.int64, count=len(shingles))
+    flat = np.fromiter((shingle for row in shingles for shingle in row), dtype=object, count=int(sizes.sum()))
+    hashes = pd.util.hash_array(flat) & np.uint64(0xFFFFFFFF)
+
+    multipliers, offsets = permutations(BANDS * BAND_ROWS)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    result = np.empty((len(texts), BANDS * BAND_ROWS), dtype=np.uint64)
+    for position, (a, b) in enumerate(zip(multipliers, offsets)):
+        permuted = (hashes * a + b) % np.uint64(MINHASH_PRIME)
+        result[:, position] = np.minimum.reduceat(permuted, starts) if len(texts) else []
+    return result
+
+
+def chunk_keys(frame, mode):
+    return signatures(frame) if mode == "minhash" else row_hashes(frame, mode)
+
+
+# Hashes (or signatures) of the key columns, chunk by chunk. Files not in
+# the cache are read in record batches of the key columns only, so memory
+# holds 8 bytes per row (BANDS * BAND_ROWS * 8 for MinHash), not the data.
+def dataset_keys(dataset, columns, mode):
+    frame = dataframe_cache.get(storage.cache_key(dataset))
+    if frame is None and not dataset.storage_path:
+        frame = storage.read_dataframe(dataset)
+    if frame is not None:
+        columns = check_columns(frame.columns, columns)
+        chunks = (frame[columns].iloc[start:start + DEDUP_CHUNK_ROWS] for start in range(0, len(frame), DEDUP_CHUNK_ROWS))
+    else:
+        parquet_file = pq.ParquetFile(dataset.storage_path)
+        columns = check_columns(parquet_file.schema_arrow.names, columns)
+        chunks = (batch.to_pandas() for batch in streaming.batches(parquet_file, columns))
+
+    keys = [chunk_keys(chunk, mode) for chunk in chunks]
+    if not keys:
+        width = BANDS * BAND_ROWS if mode == "minhash" else None
+        return columns, np.empty((0, width) if width else 0, dtype=np.uint64)
+    return columns, np.concatenate(keys)
+
+
+# Bucket of each row per band: rows agreeing on a whole band point at the
+# first row of the bucket, kept only if the signatures agree on at least
+# `threshold` of their hashes (estimated Jaccard similarity). Each row
+# links to its smallest such row and links are followed to the root, so
+# a group is a near-duplicate chain started by its first row.
+def near_groups(keys, threshold):
+    count = len(keys)
+    positions = np.arange(count)
+    links = positions.copy()
+    for band in range(BANDS):
+        columns = keys[:, band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        bucket = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+        first = pd.Series(positions).groupby(bucket).transform("min").to_numpy()
+        similar = (keys == keys[first]).mean(axis=1) >= threshold
+        links = np.where(similar, np.minimum(links, first), links)
+
+    while True:
+        parents = links[links]
+        if np.array_equal(parents, links):
+            return links
+        links = parents
+
+
+# Group id of each row: the position of the first row of its group
+def group_ids(keys, mode, threshold):
+    if mode == "minhash":
+        return near_groups(keys, threshold)
+    codes, _ = pd.factorize(keys)
+    first = np.full(codes.max() + 1 if len(codes) else 0, len(codes), dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    return first[codes]
+
+
+# Rows to drop, keeping the first row of every group
+def duplicate_mask(frame, columns=None, mode="exact", threshold=0.8):
+    names = backend.columns(frame)
+    columns = check_columns(list(names), columns)
+    keys_frame = backend.key_frame(frame, columns)
+    if not len(keys_frame):
+        return np.zeros(0, dtype=bool)
+    keys = np.concatenate([
+        chunk_keys(keys_frame.iloc[start:start + DEDUP_CHUNK_ROWS], mode)
+        for start in range(0, len(keys_frame), DEDUP_CHUNK_ROWS)
+    ])
+    return group_ids(keys, mode, threshold) != np.arange(len(keys))
+
+
+# Clean step: drops duplicate rows by key columns. Returns the frame and
+# the number of rows removed.
+def deduplicate(frame, columns=None, mode="exact", threshold=0.8):
+    mask = duplicate_mask(frame, columns, mode, threshold)
+    return backend.drop_rows(frame, mask), int(mask.sum())
+
+
+def rows_at(dataset, positions, columns):
+    frame = dataframe_cache.get(storage.cache_key(dataset))
+    if frame is None and not dataset.storage_path:
+        frame = storage.read_dataframe(dataset)
+    if frame is not None:
+        return frame[columns].iloc[positions]
+    return storage.read_scattered_rows(dataset, positions, columns)
+
+
+# Entry point for workers.run_cpu behind /duplicates: what a dedup with
+# these settings would remove, and the largest duplicate groups with a
+# few of their rows. Nothing is changed.
+def duplicate_report(dataset, columns, mode, threshold, group_limit, group_rows):
+    columns, keys = dataset_keys(dataset, columns, mode)
+    groups = group_ids(keys, mode, threshold)
+    row_count = len(groups)
+
+    sizes = np.bincount(groups, minlength=row_count) if row_count else np.zeros(0, dtype=np.int64)
+    repeated = np.flatnonzero(sizes > 1)
+    largest = repeated[np.lexsort((repeated, -sizes[repeated]))][:group_limit]
+
+    members = {group: np.flatnonzero(groups == group)[:group_rows] for group in largest}
+    picked = np.sort(np.concatenate(list(members.values()))) if members else np.empty(0, dtype=np.int64)
+    values = rows_at(dataset, picked, columns).astype(object)
+    values = values.where(values.notna(), None)
+    row_values = dict(zip(picked.tolist(), values.values.tolist()))
+
+    return {
+        "mode": mode,
+        "columns": columns,
+        "threshold": threshold if mode == "minhash" else None,
+        "row_count": row_count,
+        "duplicate_rows": int(row_count - len(np.flatnonzero(sizes))),
+        "duplicate_groups": int(len(repeated)),
+        "groups": [
+            {
+                "size": int(sizes[group]),
+                "rows": [{"row": int(row), "values": row_values[int(row)]} for row in members[group]]
+            }
+            for group in largest
+        ]
+    }
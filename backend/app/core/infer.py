@@ -0,0 +1,188 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+INFER_SAMPLE_ROWS = int(os.getenv("INFER_SAMPLE_ROWS", "10000"))
+INFER_WORKERS = int(os.getenv("INFER_WORKERS", str(min(8, os.cpu_count() or 1))))
+INFER_STRATA = 20
+MATCH_RATIO = 0.7
+DATE_RATIO = 0.5
+
+DATE_KEYWORDS = ["date", "time", "year", "month", "day", "created", "updated", "timestamp", "born", "founded"]
+BOOL_MAP = {"true": True, "false": False, "yes": True, "no": False, "1": True, "0": False}
+TRUE_WORDS = pa.array([word for word, value in BOOL_MAP.items() if value])
+BOOL_WORDS = pa.array(list(BOOL_MAP))
+
+# Patterns use RE2 syntax, as Arrow compute kernels expect
+NUMBER_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+INTEGER_PATTERN = r"^[+-]?\d+$"
+CURRENCY_PATTERN = r"^[$€£¥]?[\d,]+\.?\d*$"
+CURRENCY_SYMBOLS = ["$", "€", "£", "¥", ","]
+
+
+# Up to `size` row positions spread over INFER_STRATA equal slices of the
+# column, so values that only appear late in a sorted file are still seen
+def sample_positions(length, size=INFER_SAMPLE_ROWS):
+    if length <= size:
+        return np.arange(length)
+    rng = np.random.default_rng(0)
+    bounds = np.linspace(0, length, INFER_STRATA + 1).astype(np.int64)
+    per_stratum = size // INFER_STRATA
+    positions = [
+        low + rng.choice(high - low, min(per_stratum, high - low), replace=False)
+        for low, high in zip(bounds[:-1], bounds[1:])
+    ]
+    return np.sort(np.concatenate(positions))
+
+
+def to_text(column):
+    values = column.to_numpy(dtype=object)
+    try:
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed objects: stringify everything except missing values
+        values = column.where(column.isna(), column.astype(str)).to_numpy(dtype=object)
+        return pa.array(values, type=pa.string(), from_pandas=True)
+
+
+def ratio(mask, total):
+    return pc.sum(mask).as_py() / total if total else 0.0
+
+
+# Numbers the way float() reads them; anything else becomes null
+def parse_numbers(text):
+    valid = pc.fill_null(pc.match_substring_regex(text, NUMBER_PATTERN), False)
+    numbers = pc.cast(pc.if_else(valid, text, pa.scalar(None, pa.string())), pa.float64())
+    # Whole columns of plain integers stay integers, like pd.to_numeric
+    if numbers.null_count == 0 and len(text) and pc.all(pc.match_substring_regex(text, INTEGER_PATTERN)).as_py():
+        try:
+            return pc.cast(text, pa.int64()).to_numpy()
+        except pa.ArrowInvalid:
+            pass
+    return numbers.to_numpy(zero_copy_only=False)
+
+
+def is_boolean(text):
+    uniques = pc.drop_null(pc.unique(pc.utf8_lower(text)))
+    return 0 < len(uniques) <= 2 and pc.all(pc.is_in(uniques, value_set=BOOL_WORDS)).as_py()
+
+
+# Picks a rule for an object column from a sample of its values, trying the
+# same checks in the same order as before: dates (by column name),
+# booleans, plain numbers, percentages and currency amounts.
+def decide(name, sample, allow_boolean=True):
+    if any(word in str(name).lower() for word in DATE_KEYWORDS):
+        parsed = pd.to_datetime(sample, errors="coerce")
+        date_ratio = float(parsed.notna().mean()) if len(sample) else 0.0
+        if date_ratio >= DATE_RATIO:
+            return "datetime", date_ratio
+
+    text = pc.drop_null(to_text(sample))
+    total = len(text)
+    if total == 0:
+        return "text", 0.0
+
+    if allow_boolean and is_boolean(text):
+        return "boolean", 1.0
+
+    compact = pc.utf8_trim_whitespace(pc.replace_substring(pc.replace_substring(text, ",", ""), " ", ""))
+    numeric_ratio = ratio(pc.match_substring_regex(compact, NUMBER_PATTERN), total)
+    if numeric_ratio >= MATCH_RATIO:
+        return "numeric", numeric_ratio
+
+    stripped = pc.utf8_trim_whitespace(text)
+    percent_ratio = ratio(pc.ends_with(stripped, "%"), total)
+    if percent_ratio >= MATCH_RATIO:
+        return "percent", percent_ratio
+
+    currency_ratio = ratio(pc.match_substring_regex(stripped, CURRENCY_PATTERN), total)
+    if currency_ratio >= MATCH_RATIO:
+        return "currency", currency_ratio
+
+    return "text", 0.0
+
+
+# Converts a whole column with one vectorized pass for the chosen rule
+def convert(column, rule):
+    if rule == "datetime":
+        return pd.to_datetime(column, errors="coerce")
+
+    text = to_text(column)
+    if rule == "boolean":
+        lowered = pc.utf8_lower(text)
+        values = pc.if_else(pc.is_null(lowered), pa.scalar(None, pa.bool_()), pc.is_in(lowered, value_set=TRUE_WORDS))
+        return pd.Series(values.to_pandas(), index=column.index, name=column.name)
+    if rule == "numeric":
+        text = pc.utf8_trim_whitespace(pc.replace_substring(text, ",", ""))
+    elif rule == "percent":
+        text = pc.utf8_trim_whitespace(pc.replace_substring(text, "%", ""))
+    elif rule == "currency":
+        # Literal replaces are about twice as fast as one regex class
+        for symbol in CURRENCY_SYMBOLS:
+            text = pc.replace_substring(text, symbol, "")
+        text = pc.utf8_trim_whitespace(text)
+    else:
+        # Plain text: trim whitespace, keep missing values missing
+        return pd.Series(
+            pc.utf8_trim_whitespace(text).to_numpy(zero_copy_only=False),
+            index=column.index, name=column.name, dtype=object
+        )
+    return pd.Series(parse_numbers(text), index=column.index, name=column.name)
+
+
+def infer_column(column, positions):
+    original = str(column.dtype)
+    if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column):
+        return None, {"column": str(column.name), "from": original, "to": original, "rule": "kept", "match_ratio": None}
+
+    rule, match_ratio = decide(column.name, column.iloc[positions])
+    if rule == "boolean" and not is_boolean(pc.drop_null(to_text(column))):
+        # The sample only showed two boolean words; the full column has more
+        rule, match_ratio = decide(column.name, column.iloc[positions], allow_boolean=False)
+
+    if rule == "text" and column.dtype != object:
+        converted = None
+        result = original
+    else:
+        converted = convert(column, rule)
+        result = str(converted.dtype)
+
+    return converted, {
+        "column": str(column.name),
+        "from": original,
+        "to": result,
+        "rule": rule,
+        "match_ratio": round(match_ratio, 4) if match_ratio is not None else None
+    }
+
+
+# Infers and applies column types for the item1 clean operation. Decisions
+# come from one shared stratified sample of rows; conversions run column by
+# column on a thread pool (the Arrow string kernels release the GIL).
+# Returns the converted frame and one report entry per column.
+def infer_types(dataframe):
+    positions = sample_positions(len(dataframe))
+    columns = [dataframe.iloc[:, position] for position in range(dataframe.shape[1])]
+
+    if INFER_WORKERS > 1 and len(columns) > 1:
+        with ThreadPoolExecutor(max_workers=INFER_WORKERS, thread_name_prefix="infer") as executor:
+            results = list(executor.map(lambda column: infer_column(column, positions), columns))
+    else:
+        results = [infer_column(column, positions) for column in columns]
+
+    converted = {
+        position: series for position, (series, _) in enumerate(results) if series is not None
+    }
+    if converted:
+        dataframe = dataframe.copy(deep=False)
+        for position, series in converted.items():
+            dataframe.isetitem(position, series)
+
+    report = [entry for _, entry in results]
+    for entry in report:
+        entry["sample_size"] = int(len(positions))
+    return dataframe, report
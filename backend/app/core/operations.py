@@ -0,0 +1,53 @@
+from fastapi import HTTPException
+
+from app.core import sandbox
+from app.core.backends import backend
+from app.core.dedup import deduplicate
+from app.core.outliers import treat_outliers
+
+BUILTIN_OPERATIONS = ("item1", "item2", "item3")
+
+
+# Applies clean operations, then the AI-generated code, to a frame of the
+# configured execution backend that the caller owns. Used for new cleans
+# and to replay logged versions. `dedup` is an optional key-column or
+# near-duplicate removal (columns, mode, threshold) and `outliers` an
+# optional cap/remove treatment (action, method, threshold, columns), both
+# run on the typed frame. Returns the result and a report: the item1 type
+# report under "types", the rows item2 and dedup removed under
+# "duplicates_removed" and the sandbox's timing and resource usage for the
+# AI code under "code_execution", when those ran.
+def apply_operations(df, operations, code=None, outliers=None, dedup=None):
+    report = {}
+    if "item1" in operations:
+        # Detect dates, booleans, numbers, percentages and currency amounts
+        df, report["types"] = backend.infer_types(df)
+
+    if "item2" in operations:
+        rows = len(df)
+        df = backend.drop_duplicates(df)
+        report["duplicates_removed"] = rows - len(df)
+
+    if dedup:
+        df, removed = deduplicate(df, **dedup)
+        report["duplicates_removed"] = report.get("duplicates_removed", 0) + removed
+
+    if outliers:
+        # Before item3, so filled-in zeros do not shift the bounds
+        df = treat_outliers(df, **outliers)
+
+    if "item3" in operations:
+        # Missing numbers become 0 and missing text "Unknown"; dates stay
+        # missing, filling them with 0 would break them
+        df = backend.fill_missing(df)
+
+    if code:
+        try:
+            # The generated code is written against pandas and runs in a
+            # resource-limited child process
+            table, report["code_execution"] = sandbox.run_code(backend.to_arrow(df), code)
+        except sandbox.SandboxError as e:
+            raise HTTPException(status_code=500, detail=f"Error applying AI suggestions: {str(e)}")
+        df = backend.from_arrow(table)
+
+    return df, report
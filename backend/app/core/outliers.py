@@ -0,0 +1,148 @@
+import warnings
+
+import numpy as np
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from app.core import sketches, streaming
+from app.core.backends import backend
+
+# Default fence per method: IQR multiples outside the quartiles, standard
+# deviations from the mean, and modified z-score (Iglewicz and Hoaglin)
+THRESHOLDS = {"iqr": 1.5, "zscore": 3.0, "mad": 3.5}
+# MAD of a normal sample times this estimates its standard deviation
+MAD_SCALE = 1.4826
+
+
+# Lower and upper bounds for every column of a float matrix at once, one
+# nanquantile / nanmean call over all columns. Infinite values are left
+# out of the statistics but still fall outside any finite bound.
+def bounds(values, method, threshold):
+    values = np.where(np.isfinite(values), values, np.nan)
+    with warnings.catch_warnings():
+        # All-NaN columns get NaN bounds and never match
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if method == "iqr":
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            return fences(q1, q3, threshold)
+        if method == "zscore":
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0, ddof=1)
+            return mean - threshold * std, mean + threshold * std
+        median = np.nanmedian(values, axis=0)
+        mad = np.nanmedian(np.abs(values - median), axis=0)
+        return median - threshold * MAD_SCALE * mad, median + threshold * MAD_SCALE * mad
+
+
+def fences(q1, q3, threshold):
+    spread = q3 - q1
+    return q1 - threshold * spread, q3 + threshold * spread
+
+
+def stat_array(columns, stat):
+    return np.array([column["stats"].get(stat, np.nan) for column in columns], dtype=float)
+
+
+# Bounds of files too large to load, from the stored profile: quartiles
+# (sketch estimates), mean and std. MAD needs one more pass that sketches
+# the absolute deviations from the median.
+def sketched_bounds(dataset, columns, method, threshold):
+    if method == "iqr":
+        return fences(stat_array(columns, "25%"), stat_array(columns, "75%"), threshold)
+    if method == "zscore":
+        mean, std = stat_array(columns, "mean"), stat_array(columns, "std")
+        return mean - threshold * std, mean + threshold * std
+
+    median = stat_array(columns, "50%")
+    deviations = [sketches.QuantileSketch() for _ in columns]
+    parquet_file = pq.ParquetFile(dataset.storage_path)
+    for batch in streaming.batches(parquet_file, [column["name"] for column in columns]):
+        for position, sketch in enumerate(deviations):
+            values = streaming.float_values(batch.column(position))
+            values = values[np.isfinite(values)]
+            sketch.update(np.abs(values - median[position]))
+    mad = np.array([sketch.quantiles([0.5])[0] for sketch in deviations])
+    return median - threshold * MAD_SCALE * mad, median + threshold * MAD_SCALE * mad
+
+
+def outside(values, lower, upper):
+    with np.errstate(invalid="ignore"):
+        return (values < lower) | (values > upper)
+
+
+# Counts outliers per column batch by batch, keeping the row numbers of
+# outliers offset..offset+limit of each column
+def scan(dataset, names, lower, upper, offset, limit):
+    counts = np.zeros(len(names), dtype=np.int64)
+    rows = [[] for _ in names]
+    start = 0
+    parquet_file = pq.ParquetFile(dataset.storage_path)
+    for batch in streaming.batches(parquet_file, names):
+        values = np.column_stack([streaming.float_values(batch.column(i)) for i in range(len(names))])
+        mask = outside(values, lower, upper)
+        for position in range(len(names)):
+            if len(rows[position]) < limit and counts[position] + mask[:, position].sum() > offset:
+                local = np.flatnonzero(mask[:, position])
+                skip = max(0, offset - counts[position])
+                needed = limit - len(rows[position])
+                rows[position].extend((start + local[skip:skip + needed]).tolist())
+        counts += mask.sum(axis=0)
+        start += batch.num_rows
+    return counts, rows
+
+
+# Worker entry point for /outliers: bounds, counts and one page of outlier
+# row numbers for each of the given numeric profile columns
+def find_outliers(dataset, columns, method, threshold, offset, limit):
+    names = [column["name"] for column in columns]
+    approximate = streaming.streams(dataset)
+
+    if not names:
+        counts, rows, lower, upper = [], [], [], []
+    elif approximate:
+        lower, upper = sketched_bounds(dataset, columns, method, threshold)
+        counts, rows = scan(dataset, names, lower, upper, offset, limit)
+    else:
+        values = backend.numeric_values(backend.read(dataset, names), names)
+        lower, upper = bounds(values, method, threshold)
+        mask = outside(values, lower, upper)
+        counts = mask.sum(axis=0)
+        rows = [np.flatnonzero(mask[:, position])[offset:offset + limit].tolist() for position in range(len(names))]
+
+    return {
+        "method": method,
+        "threshold": threshold,
+        "approximate": approximate,
+        "offset": offset,
+        "limit": limit,
+        "columns": [
+            {
+                "column": name,
+                "lower": float(lower[position]) if np.isfinite(lower[position]) else None,
+                "upper": float(upper[position]) if np.isfinite(upper[position]) else None,
+                "count": int(counts[position]),
+                "rows": rows[position]
+            }
+            for position, name in enumerate(names)
+        ]
+    }
+
+
+# Clean step: clips numeric columns to their bounds ("cap") or drops rows
+# with a value outside them in any column ("remove")
+def treat_outliers(df, action, method, threshold=None, columns=None):
+    threshold = THRESHOLDS[method] if threshold is None else threshold
+    numeric = [name for name, (_, kind) in backend.columns(df).items() if kind == "numeric"]
+    if columns:
+        unknown = [name for name in columns if name not in numeric]
+        if unknown:
+            raise HTTPException(status_code=400, detail="Not numeric columns: " + ", ".join(map(str, unknown)))
+        numeric = [name for name in numeric if name in columns]
+    if not numeric:
+        return df
+
+    values = backend.numeric_values(df, numeric)
+    lower, upper = bounds(values, method, threshold)
+    if action == "cap":
+        return backend.clip(df, numeric, lower, upper)
+    return backend.drop_rows(df, outside(values, lower, upper).any(axis=1))
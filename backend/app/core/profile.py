@@ -0,0 +1,232 @@
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+
+from app.database import storage
+from app.core import charts
+from app.core import streaming
+from app.core import workers
+from app.core.backends import backend
+from app.db_config import AsyncSessionLocal
+from app import models
+
+import json
+import numpy as np
+import pandas as pd
+
+SCATTER_ROW_GROUPS = 8
+
+
+def json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return None if np.isnan(value) or np.isinf(value) else value
+    if isinstance(value, (int, str, bool)):
+        return value
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def build_profile(dataframe):
+    columns_info = backend.columns(dataframe)
+    numeric_columns = [column_name for column_name, (_, kind) in columns_info.items() if kind == "numeric"]
+
+    correlation = None
+    if len(numeric_columns) >= 2:
+        correlation = backend.correlation(dataframe, numeric_columns)
+
+    return assemble_profile(
+        shape=dataframe.shape,
+        columns_info=columns_info,
+        described=backend.describe(dataframe),
+        null_counts=backend.null_counts(dataframe),
+        histograms=backend.histograms(dataframe, numeric_columns),
+        top_values={
+            column_name: backend.value_counts(dataframe, column_name)
+            for column_name, (_, kind) in columns_info.items() if kind != "numeric"
+        },
+        correlation=correlation,
+        head=backend.head(dataframe)
+    )
+
+
+# Profile dict from per-column results, shared by the in-memory and the
+# streaming builders
+def assemble_profile(shape, columns_info, described, null_counts, histograms, top_values, correlation, head):
+    columns = []
+    for column_name, (dtype, kind) in columns_info.items():
+        stats = {}
+        for stat, value in described.get(column_name, {}).items():
+            value = json_value(value)
+            if value is not None:
+                stats[stat] = value
+
+        histogram = None
+        top = None
+        if kind == "numeric":
+            counts, edges = histograms[column_name]
+            histogram = {"counts": counts.tolist(), "edges": edges.tolist()}
+        else:
+            labels, counts = top_values[column_name]
+            top = {"labels": labels, "counts": counts}
+
+        columns.append({
+            "name": str(column_name),
+            "dtype": dtype,
+            "kind": kind,
+            "null_count": int(null_counts[column_name]),
+            "stats": stats,
+            "histogram": histogram,
+            "top_values": top
+        })
+
+    if correlation is not None:
+        labels, matrix = correlation
+        correlation = {"labels": labels, "matrix": charts.finite_or_none(matrix)}
+
+    row_count, column_count = shape
+    return {
+        "row_count": int(row_count),
+        "column_count": int(column_count),
+        "head": head.to_string(),
+        "columns": columns,
+        "correlation": correlation
+    }
+
+
+# Files too large to load are profiled in one streaming pass
+def build_stored_profile(dataset):
+    if streaming.streams(dataset):
+        return assemble_profile(**streaming.summarize(dataset))
+    return build_profile(backend.read(dataset))
+
+
+def numeric_names(profile):
+    return [column["name"] for column in profile["columns"] if column["kind"] == "numeric"]
+
+
+# Only the columns the scatter pairs need are read, and for files too
+# large to load only a few random row groups of them
+def pair_frame(dataset, pairs):
+    columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+    if streaming.streams(dataset):
+        return storage.read_sample(dataset, columns, SCATTER_ROW_GROUPS)
+    return storage.read_dataframe(dataset, columns)
+
+
+# Entry points for workers.run_cpu: take a DatasetRef, return plain data
+def build_charts(dataset, profile, pairs):
+    return charts.profile_charts(profile, pair_frame(dataset, pairs), pairs)
+
+
+def build_scatter(dataset, col_x, col_y):
+    pairs = [(col_x, col_y)]
+    return charts.scatter_charts(pair_frame(dataset, pairs), pairs)[0]
+
+
+def add_profile(session, dataset, profile):
+    session.add(models.DatasetProfile(
+        dataset_id=dataset.id,
+        version=dataset.version or 0,
+        row_count=profile["row_count"],
+        column_count=profile["column_count"],
+        head=profile["head"],
+        correlation=json.dumps(profile["correlation"]) if profile["correlation"] else None
+    ))
+    for position, column in enumerate(profile["columns"]):
+        session.add(models.ColumnProfile(
+            dataset_id=dataset.id,
+            version=dataset.version or 0,
+            position=position,
+            name=column["name"],
+            dtype=column["dtype"],
+            kind=column["kind"],
+            null_count=column["null_count"],
+            stats=json.dumps(column["stats"]),
+            histogram=json.dumps(column["histogram"]) if column["histogram"] else None,
+            top_values=json.dumps(column["top_values"]) if column["top_values"] else None
+        ))
+
+
+# Replaces the stored profile of a dataset version; committed by the caller.
+# Profiles of other versions stay for diffs and are pruned with them.
+async def save_profile(session, dataset, profile):
+    version = dataset.version or 0
+    await session.execute(
+        delete(models.ColumnProfile).where(
+            models.ColumnProfile.dataset_id == dataset.id,
+            models.ColumnProfile.version == version
+        )
+    )
+    await session.execute(
+        delete(models.DatasetProfile).where(
+            models.DatasetProfile.dataset_id == dataset.id,
+            models.DatasetProfile.version == version
+        )
+    )
+    add_profile(session, dataset, profile)
+
+
+async def fetch_profile(session, dataset):
+    version = dataset.version or 0
+    result = await session.execute(
+        select(models.DatasetProfile).where(
+            models.DatasetProfile.dataset_id == dataset.id,
+            models.DatasetProfile.version == version
+        )
+    )
+    dataset_profile = result.scalar_one_or_none()
+    if dataset_profile is None:
+        return None
+
+    result = await session.execute(
+        select(models.ColumnProfile)
+        .where(
+            models.ColumnProfile.dataset_id == dataset.id,
+            models.ColumnProfile.version == version
+        )
+        .order_by(models.ColumnProfile.position)
+    )
+
+    columns = []
+    for row in result.scalars():
+        columns.append({
+            "name": row.name,
+            "dtype": row.dtype,
+            "kind": row.kind,
+            "null_count": row.null_count,
+            "stats": json.loads(row.stats),
+            "histogram": json.loads(row.histogram) if row.histogram else None,
+            "top_values": json.loads(row.top_values) if row.top_values else None
+        })
+
+    return {
+        "row_count": dataset_profile.row_count,
+        "column_count": dataset_profile.column_count,
+        "head": dataset_profile.head,
+        "columns": columns,
+        "correlation": json.loads(dataset_profile.correlation) if dataset_profile.correlation else None
+    }
+
+
+# Stored profile of the current version, computed on first use for rows
+# uploaded before profiles existed
+async def load_profile(session, dataset):
+    profile = await fetch_profile(session, dataset)
+    if profile is not None:
+        return profile
+
+    profile = await workers.run_cpu(build_stored_profile, storage.ref(dataset))
+
+    # Own session, so a conflicting insert never rolls back the caller's
+    async with AsyncSessionLocal() as profile_session:
+        try:
+            await save_profile(profile_session, dataset, profile)
+            await profile_session.commit()
+        except IntegrityError:
+            # Another request stored the same version first
+            await profile_session.rollback()
+    return profile
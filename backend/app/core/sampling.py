@@ -0,0 +1,170 @@
+import math
+import os
+from typing import Literal, Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, Query
+
+from app.core import charts
+from app.core.backends import backend
+from app.core.profile import build_profile
+from app.database import storage
+from app.database.cache import dataframe_cache
+
+# Rows behind sampled charts unless a fraction is asked for. Bar heights
+# are scaled to the full row count and come with 95% margins of error,
+# about +-1% of the rows at this size.
+CHART_SAMPLE_ROWS = int(os.getenv("CHART_SAMPLE_ROWS", "10000"))
+# Parquet files that are not cached are sampled inside this many randomly
+# picked row groups (more if they hold too few rows), so a sample reads a
+# bounded part of the file instead of touching nearly every row group
+CHART_SAMPLE_ROW_GROUPS = int(os.getenv("CHART_SAMPLE_ROW_GROUPS", "8"))
+CONFIDENCE = 0.95
+Z_SCORE = 1.959964
+
+
+# Query parameters of the sampled chart modes, shared by /analyze and
+# /visualize
+def sample_options(
+    sample_rows: int = Query(CHART_SAMPLE_ROWS, ge=10, le=1_000_000),
+    sample_fraction: Optional[float] = Query(None, gt=0, le=1),
+    sampling: Literal["reservoir", "stratified"] = "reservoir",
+    stratify: Optional[str] = None
+):
+    if sampling == "stratified" and stratify is None:
+        raise HTTPException(status_code=400, detail="Stratified sampling needs a stratify column")
+    return {"rows": sample_rows, "fraction": sample_fraction, "method": sampling, "stratify": stratify}
+
+
+def sample_size(population, rows, fraction):
+    size = math.ceil(population * fraction) if fraction is not None else rows
+    return min(population, size)
+
+
+# Positions of a uniform sample without replacement. The number of rows
+# to draw from is known up front, so the sample reservoir sampling would
+# keep over one pass can be drawn directly.
+def reservoir_positions(population, size, rng):
+    return np.sort(rng.choice(population, size, replace=False))
+
+
+# Proportional allocation: each stratum (missing values are one) gets its
+# share of the sample, rounded, and at least one row
+def stratified_positions(codes, size, rng):
+    population = len(codes)
+    counts = np.bincount(codes)
+    quotas = np.minimum(counts, np.maximum(1, np.round(size * counts / population))).astype(np.int64)
+
+    # Random order within each stratum, then the first `quota` rows of each
+    order = np.lexsort((rng.random(population), codes))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(population) - np.repeat(starts, counts)
+    return np.sort(order[rank < quotas[codes[order]]])
+
+
+# Sampled rows as a pandas frame, the full row count and the number of
+# rows the sample was drawn from. Datasets in the cache or without a
+# Parquet file are sampled in memory; other files are read only in the
+# row groups picked by storage.pick_row_groups, so the sample is
+# clustered by row group and its margins, which treat rows as drawn
+# independently, are narrower than the true ones when groups differ.
+def sample_frame(dataset, rows=CHART_SAMPLE_ROWS, fraction=None, method="reservoir", stratify=None):
+    if stratify is not None and stratify not in storage.column_names(dataset):
+        raise HTTPException(status_code=400, detail="Unknown columns: " + stratify)
+
+    rng = np.random.default_rng(42)
+    frame = dataframe_cache.get(storage.cache_key(dataset))
+    if frame is None and not dataset.storage_path:
+        frame = storage.read_dataframe(dataset)
+    if frame is not None:
+        population = len(frame)
+        size = sample_size(population, rows, fraction)
+    else:
+        population = int(storage.row_group_starts(dataset.storage_path)[-1])
+        size = sample_size(population, rows, fraction)
+        groups = storage.pick_row_groups(dataset.storage_path, size, CHART_SAMPLE_ROW_GROUPS, rng)
+        frame = storage.read_row_groups(dataset, groups)
+
+    if method == "stratified":
+        codes, _ = pd.factorize(frame[stratify], use_na_sentinel=False)
+        positions = stratified_positions(codes, size, rng)
+    else:
+        positions = reservoir_positions(len(frame), size, rng)
+    return frame.iloc[positions].reset_index(drop=True), population, len(frame)
+
+
+# 95% margin of an estimated count of N * p from a sample of n, finite
+# population corrected
+def count_margins(sample_counts, sample_rows, population):
+    if sample_rows == 0 or sample_rows >= population:
+        return np.zeros(len(sample_counts))
+    share = np.asarray(sample_counts, dtype=float) / sample_rows
+    correction = (population - sample_rows) / (population - 1)
+    return Z_SCORE * population * np.sqrt(share * (1 - share) / sample_rows * correction)
+
+
+# Fisher z interval of each correlation
+def correlation_interval(matrix, sample_rows):
+    matrix = np.asarray(matrix, dtype=float)
+    if sample_rows <= 3:
+        return np.full_like(matrix, np.nan), np.full_like(matrix, np.nan)
+    spread = Z_SCORE / np.sqrt(sample_rows - 3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.arctanh(np.clip(matrix, -1.0, 1.0))
+    return np.tanh(z - spread), np.tanh(z + spread)
+
+
+def scaled(counts, factor):
+    return np.round(np.asarray(counts, dtype=float) * factor).astype(np.int64).tolist()
+
+
+# Turns a profile of the sample into an estimate for the full dataset:
+# counts scaled by population / sample size, with margins of error added
+# to the histograms, top values and correlation matrix. sample_rows is
+# the number of rows actually profiled.
+def scale_profile(profile, population, sample_rows):
+    factor = population / sample_rows if sample_rows else 0.0
+
+    for column in profile["columns"]:
+        column["null_count"] = int(round(column["null_count"] * factor))
+        for stat in ("count", "freq"):
+            if stat in column["stats"]:
+                column["stats"][stat] = int(round(column["stats"][stat] * factor))
+        for part in (column["histogram"], column["top_values"]):
+            if part is not None:
+                part["error"] = np.round(count_margins(part["counts"], sample_rows, population), 1).tolist()
+                part["counts"] = scaled(part["counts"], factor)
+
+    correlation_data = profile["correlation"]
+    if correlation_data is not None:
+        low, high = correlation_interval(correlation_data["matrix"], sample_rows)
+        correlation_data["low"] = charts.finite_or_none(np.round(low, 3))
+        correlation_data["high"] = charts.finite_or_none(np.round(high, 3))
+
+    profile["row_count"] = population
+    return profile
+
+
+# Entry point for workers.run_cpu: profile and charts of a sample, scaled
+# to the full dataset. The profile is never stored; it stands in for the
+# exact one in sampled analyses.
+def sampled_charts(dataset, options, scatter_pairs=charts.SCATTER_TOP_PAIRS):
+    frame, population, source_rows = sample_frame(dataset, **options)
+    profile = scale_profile(build_profile(backend.from_pandas(frame)), population, len(frame))
+    pairs = charts.top_pairs(profile["correlation"], scatter_pairs)
+    pair_columns = list(dict.fromkeys(column for pair in pairs for column in pair))
+    return {
+        "profile": profile,
+        "charts": charts.profile_charts(profile, frame[pair_columns], pairs),
+        "sample": {
+            "method": options["method"],
+            "stratify": options["stratify"],
+            "rows": len(frame),
+            "population_rows": population,
+            "source_rows": source_rows,
+            "clustered": source_rows < population,
+            "fraction": len(frame) / population if population else 1.0,
+            "confidence": CONFIDENCE
+        }
+    }
@@ -0,0 +1,187 @@
+# Runs AI-generated cleaning code in a separate Python process with CPU
+# time, wall-clock and memory limits, so a runaway loop or a huge join
+# fails that one clean instead of stalling or killing the API worker.
+# Frames cross as Arrow IPC files that both sides memory-map. This file
+# is also the child's entry point and runs there without the app package,
+# so it only imports the standard library and pyarrow at the top.
+#
+# The limits are about resources, not trust: the child still runs as the
+# API's user. It only gets the variables in SANDBOX_ENVIRONMENT, which
+# keeps API keys out of its reach.
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: only the wall-clock limit applies there
+    resource = None
+
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+
+SANDBOX_ENVIRONMENT = {
+    "PATH": os.getenv("PATH", "/usr/bin:/bin"),
+    "LANG": os.getenv("LANG", "C.UTF-8"),
+    # One thread per library so the CPU limit is not spent in parallel
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+}
+
+INPUT_FILE = "input.arrow"
+OUTPUT_FILE = "output.arrow"
+CODE_FILE = "code.py"
+STATUS_FILE = "status.json"
+
+
+class SandboxError(Exception):
+    pass
+
+
+def write_arrow(path, table):
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_arrow(path):
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+# Parent side: runs `code` on `table` (it sees it as the pandas DataFrame
+# `df`, with `pd` and `np`) and returns the resulting table and a usage
+# report. Raises SandboxError when the code fails or hits a limit.
+def run_code(table, code):
+    with tempfile.TemporaryDirectory(prefix="sandbox-") as directory:
+        start = time.perf_counter()
+        write_arrow(os.path.join(directory, INPUT_FILE), table)
+        with open(os.path.join(directory, CODE_FILE), "w", encoding="utf-8") as code_file:
+            code_file.write(code)
+        input_seconds = time.perf_counter() - start
+
+        process = subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__), directory,
+             str(SANDBOX_CPU_SECONDS), str(SANDBOX_MEMORY_MB)],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            env=SANDBOX_ENVIRONMENT, cwd=directory
+        )
+        try:
+            _, stderr = process.communicate(timeout=SANDBOX_WALL_SECONDS)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise SandboxError(f"wall-clock limit of {SANDBOX_WALL_SECONDS:g} s exceeded")
+
+        status_path = os.path.join(directory, STATUS_FILE)
+        status = None
+        if os.path.exists(status_path):
+            with open(status_path, encoding="utf-8") as status_file:
+                status = json.load(status_file)
+
+        if status is None or process.returncode != 0:
+            if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL) and status is None:
+                raise SandboxError(f"CPU time limit of {SANDBOX_CPU_SECONDS} s exceeded")
+            lines = stderr.decode(errors="replace").strip().splitlines()
+            raise SandboxError(lines[-1] if lines else f"code process exited with status {process.returncode}")
+        if "error" in status:
+            raise SandboxError(status["error"])
+
+        output_start = time.perf_counter()
+        result = read_arrow(os.path.join(directory, OUTPUT_FILE))
+        output_seconds = time.perf_counter() - output_start
+
+    usage = status["usage"]
+    usage["wall_seconds"] = round(time.perf_counter() - start, 4)
+    usage["transfer_seconds"] = round(usage["transfer_seconds"] + input_seconds + output_seconds, 4)
+    usage["input_rows"] = table.num_rows
+    usage["output_rows"] = result.num_rows
+    return result, usage
+
+
+# Same fallback as storage.to_arrow (mixed object columns become text);
+# repeated here because the child cannot import the app package
+def to_arrow(dataframe):
+    dataframe = dataframe.copy(deep=False)
+    dataframe.columns = [str(column) for column in dataframe.columns]
+    try:
+        return pa.Table.from_pandas(dataframe, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        for column in dataframe.columns:
+            if dataframe[column].dtype == object:
+                values = dataframe[column]
+                dataframe[column] = values.where(values.isna(), values.astype(str))
+        return pa.Table.from_pandas(dataframe, preserve_index=False)
+
+
+def set_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    # SIGXCPU at the soft limit, SIGKILL a second later
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+# Child side: the status file gets either an error or the usage report
+def child(directory, cpu_seconds, memory_mb):
+    set_limits(cpu_seconds, memory_mb)
+    import numpy as np
+    import pandas as pd
+
+    def finish(status):
+        with open(os.path.join(directory, STATUS_FILE), "w", encoding="utf-8") as status_file:
+            json.dump(status, status_file)
+
+    start = time.perf_counter()
+    df = read_arrow(os.path.join(directory, INPUT_FILE)).to_pandas()
+    with open(os.path.join(directory, CODE_FILE), encoding="utf-8") as code_file:
+        code = code_file.read()
+    read_seconds = time.perf_counter() - start
+
+    local_vars = {"df": df, "pd": pd, "np": np}
+    exec_start = time.perf_counter()
+    try:
+        exec(code, local_vars)
+    except MemoryError:
+        finish({"error": f"memory limit of {memory_mb} MB exceeded"})
+        return
+    except Exception as e:
+        finish({"error": str(e)})
+        return
+    exec_seconds = time.perf_counter() - exec_start
+
+    result = local_vars.get("df")
+    if not isinstance(result, pd.DataFrame):
+        finish({"error": "the code must leave a DataFrame in df"})
+        return
+
+    write_start = time.perf_counter()
+    try:
+        write_arrow(os.path.join(directory, OUTPUT_FILE), to_arrow(result))
+    except MemoryError:
+        finish({"error": f"memory limit of {memory_mb} MB exceeded"})
+        return
+    except (pa.ArrowException, ValueError, TypeError) as e:
+        finish({"error": "could not store the result: " + str(e)})
+        return
+    write_seconds = time.perf_counter() - write_start
+
+    usage = {"exec_seconds": round(exec_seconds, 4), "transfer_seconds": read_seconds + write_seconds}
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        usage["cpu_seconds"] = round(own.ru_utime + own.ru_stime, 4)
+        usage["peak_memory_mb"] = round(own.ru_maxrss / 1024, 1)
+    finish({"usage": usage})
+
+
+if __name__ == "__main__":
+    child(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
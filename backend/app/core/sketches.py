@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+QUANTILE_SKETCH_K = 400
+DISTINCT_PRECISION = 15
+TOP_VALUES_CAPACITY = 1024
+
+# Mergeable summaries for statistics computed one batch at a time. Each
+# keeps bounded state however many rows go through it, and two summaries
+# of different batches merge into the summary of both.
+
+
+# Count, mean, variance and range; batches combine with the parallel
+# form of Welford's update (Chan et al.), which stays accurate where
+# running sums of squares would cancel
+class Moments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        if not len(values):
+            return
+        batch = Moments()
+        batch.count = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+# KLL quantile sketch: level i holds items standing for 2**i values each.
+# A full level is sorted and every other item (random offset) moves up,
+# so the rank error stays around 1/K whatever the number of values.
+class QuantileSketch:
+    def __init__(self, k=QUANTILE_SKETCH_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+
+    def merge(self, other):
+        self.count += other.count
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.compress()
+
+    def compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                odd = len(items) % 2
+                promoted = items[odd + self.rng.integers(2)::2]
+                self.levels[level] = items[:odd]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, probabilities):
+        if not self.count:
+            return [np.nan] * len(probabilities)
+        items, cumulative = self.weighted()
+        ranks = np.asarray(probabilities) * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, ranks, side="left"), len(items) - 1)
+        return items[positions].tolist()
+
+    # Estimated share of values <= each point
+    def cdf(self, points):
+        if not self.count:
+            return np.zeros(len(points))
+        items, cumulative = self.weighted()
+        positions = np.searchsorted(items, points, side="right")
+        below = np.concatenate([[0.0], cumulative])[positions]
+        return below / cumulative[-1]
+
+
+# HyperLogLog distinct count over 64-bit hashes, about 0.6% standard
+# error at the default precision
+class DistinctCounter:
+    def __init__(self, precision=DISTINCT_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        if not len(values):
+            return
+        hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Position of the first set bit; rest < 2**53 converts exactly
+        _, length = np.frexp(rest.astype(np.float64))
+        np.maximum.at(self.registers, index, (bits - length + 1).astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        raw = alpha * size * size / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(size * np.log(size / zeros)))
+        return int(round(raw))
+
+
+# Space-saving heavy hitters fed with exact per-batch counts. Counts are
+# exact until more than `capacity` distinct values have been seen; after
+# that a value's count overestimates by at most `floor`, the largest
+# count ever dropped.
+class TopValues:
+    def __init__(self, capacity=TOP_VALUES_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="int64")
+        self.floor = 0
+
+    def update(self, counts):
+        if self.floor:
+            # Values seen for the first time may have been dropped before
+            counts = counts + np.where(counts.index.isin(self.counts.index), 0, self.floor)
+        combined = counts
+        if len(self.counts):
+            combined = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum()
+        if len(combined) > self.capacity:
+            values = combined.to_numpy()
+            order = np.argpartition(-values, self.capacity)
+            self.floor = max(self.floor, int(values[order[self.capacity]]))
+            combined = combined.iloc[order[:self.capacity]]
+        self.counts = combined.astype("int64")
+
+    def merge(self, other):
+        # Values the other side does not monitor may have had up to its floor
+        if other.floor:
+            monitored = self.counts.index.isin(other.counts.index)
+            self.counts = self.counts.where(monitored, self.counts + other.floor)
+        floor = self.floor + other.floor
+        self.update(other.counts)
+        self.floor = max(self.floor, floor)
+
+    @property
+    def exact(self):
+        return self.floor == 0
+
+    def top(self, limit):
+        return self.counts.sort_values(ascending=False, kind="stable").head(limit)
+
+
+# Pairwise-complete co-moments of numeric columns, for the same matrix
+# DataFrame.corr() gives. Values are shifted by the first batch's means
+# to keep the sums well conditioned.
+class CoMoments:
+    def __init__(self, column_count):
+        self.shift = None
+        size = (column_count, column_count)
+        self.count = np.zeros(size)
+        self.sums = np.zeros(size)
+        self.squares = np.zeros(size)
+        self.products = np.zeros(size)
+
+    def update(self, values):
+        present = np.isfinite(values)
+        if self.shift is None:
+            counts = present.sum(axis=0)
+            self.shift = np.where(present, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+        shifted = np.where(present, values - self.shift, 0.0)
+        mask = present.astype(np.float64)
+        self.count += mask.T @ mask
+        # sums[i, j]: sum of column i over rows where column j is present
+        self.sums += shifted.T @ mask
+        self.squares += (shifted ** 2).T @ mask
+        self.products += shifted.T @ shifted
+
+    def merge(self, other):
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift
+        # Re-center the other side's sums on this side's shift
+        offset = other.shift - self.shift
+        self.products += (
+            other.products + offset[None, :] * other.sums + offset[:, None] * other.sums.T
+            + np.outer(offset, offset) * other.count
+        )
+        self.squares += other.squares + 2 * offset[:, None] * other.sums + offset[:, None] ** 2 * other.count
+        self.sums += other.sums + offset[:, None] * other.count
+        self.count += other.count
+
+    def correlation(self):
+        count, sums, squares = self.count, self.sums, self.squares
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance = count * self.products - sums * sums.T
+            spread = (count * squares - sums ** 2) * (count * squares.T - sums.T ** 2)
+            matrix = covariance / np.sqrt(spread)
+        matrix[count < 2] = np.nan
+        return np.clip(matrix, -1.0, 1.0)
@@ -0,0 +1,248 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.core import charts, sketches
+from app.core.backends import QUANTILES, column_kind
+from app.database import storage
+
+# Parquet files whose data takes more than this uncompressed (from the
+# row group metadata, so dictionary and run-length encoding do not hide
+# the size) are profiled in one pass over record batches with bounded
+# memory instead of being loaded as one DataFrame, which in pandas is
+# several times larger again. Quantiles, distinct counts and top
+# categories of such profiles are estimates from mergeable sketches;
+# counts, means and ranges are exact.
+STREAMING_PROFILE_MB = int(os.getenv("STREAMING_PROFILE_MB", "64"))
+STREAMING_BATCH_ROWS = int(os.getenv("STREAMING_BATCH_ROWS", str(storage.ROW_GROUP_SIZE)))
+
+NANOSECONDS = {"s": 1_000_000_000, "ms": 1_000_000, "us": 1_000, "ns": 1}
+
+
+# Version files are never rewritten, so their size is looked up once
+@functools.lru_cache(maxsize=1024)
+def uncompressed_bytes(path):
+    metadata = pq.read_metadata(path)
+    return sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+
+
+def streams(dataset):
+    return bool(dataset.storage_path) and uncompressed_bytes(dataset.storage_path) > STREAMING_PROFILE_MB * 1024 * 1024
+
+
+def batches(parquet_file, columns=None):
+    return parquet_file.iter_batches(batch_size=STREAMING_BATCH_ROWS, columns=columns)
+
+
+# Value ranges of numeric columns from the row group statistics, so the
+# histogram bins are fixed before the first batch is read. Columns without
+# usable statistics are marked unknown and get a histogram estimated from
+# their quantile sketch.
+def statistics_ranges(parquet_file, names):
+    metadata = parquet_file.metadata
+    index = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+    lows = np.full(len(names), np.inf)
+    highs = np.full(len(names), -np.inf)
+    known = np.ones(len(names), dtype=bool)
+
+    for group in range(metadata.num_row_groups):
+        row_group = metadata.row_group(group)
+        for position, name in enumerate(names):
+            statistics = row_group.column(index[name]).statistics
+            if statistics is not None and statistics.has_min_max:
+                lows[position] = min(lows[position], float(statistics.min))
+                highs[position] = max(highs[position], float(statistics.max))
+            elif statistics is None or statistics.null_count != row_group.num_rows:
+                known[position] = False
+
+    known &= np.isfinite(lows) & np.isfinite(highs)
+    return known, lows, highs
+
+
+def float_values(array):
+    return pc.cast(array, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def datetime_values(array):
+    values = pc.cast(pc.drop_null(array), pa.int64()).to_numpy(zero_copy_only=False)
+    return values.astype(np.float64) * NANOSECONDS[array.type.unit]
+
+
+def batch_counts(array):
+    counts = pc.value_counts(pc.drop_null(array))
+    values = counts.field("values").to_pandas()
+    return pd.Series(counts.field("counts").to_numpy(), index=pd.Index(values))
+
+
+class NumericColumn:
+    def __init__(self):
+        self.moments = sketches.Moments()
+        self.quantiles = sketches.QuantileSketch()
+        self.finite_low = np.inf
+        self.finite_high = -np.inf
+
+    def update(self, values):
+        values = values[~np.isnan(values)]
+        self.moments.update(values)
+        self.quantiles.update(values)
+        finite = values[np.isfinite(values)]
+        if len(finite):
+            self.finite_low = min(self.finite_low, finite.min())
+            self.finite_high = max(self.finite_high, finite.max())
+
+    def describe(self):
+        moments = self.moments
+        if not moments.count:
+            return {"count": 0.0}
+        q1, q2, q3 = self.quantiles.quantiles(list(QUANTILES.values()))
+        return {
+            "count": float(moments.count),
+            "mean": moments.mean,
+            "std": moments.std(),
+            "min": moments.min,
+            "25%": q1,
+            "50%": q2,
+            "75%": q3,
+            "max": moments.max
+        }
+
+    # Equal-width bins over the finite range, filled from the quantile
+    # sketch's distribution
+    def estimated_histogram(self, bins=charts.HISTOGRAM_BINS):
+        has_values = self.finite_low <= self.finite_high
+        low, high = charts.histogram_range(
+            np.array([self.finite_low if has_values else 0.0]),
+            np.array([self.finite_high if has_values else 1.0])
+        )
+        edges = np.linspace(low[0], high[0], bins + 1)
+        if not has_values:
+            return np.zeros(bins, dtype=np.int64), edges
+        shares = self.quantiles.cdf(edges)
+        shares[0] = 0.0
+        return np.round(np.diff(shares) * self.quantiles.count).astype(np.int64), edges
+
+
+class CategoricalColumn:
+    def __init__(self):
+        self.count = 0
+        self.top_values = sketches.TopValues()
+        self.distinct = sketches.DistinctCounter()
+
+    def update(self, array):
+        counts = batch_counts(array)
+        self.count += int(counts.sum())
+        self.top_values.update(counts)
+        self.distinct.update(counts.index.to_numpy(dtype=object))
+
+    def unique(self):
+        # Exact while the top values summary has never dropped a value
+        return len(self.top_values.counts) if self.top_values.exact else self.distinct.estimate()
+
+    def describe(self):
+        stats = {"count": self.count, "unique": self.unique()}
+        top = self.top_values.top(1)
+        if len(top):
+            stats["top"] = top.index[0]
+            stats["freq"] = int(top.iloc[0])
+        return stats
+
+    def top(self, limit=charts.TOP_CATEGORIES):
+        counts = self.top_values.top(limit)
+        return counts.index.astype(str).tolist(), counts.to_numpy().tolist()
+
+
+# One pass over the stored Parquet file in record batches. Returns the
+# same pieces profile.assemble_profile takes, with memory bounded by the
+# batch size and the sketches whatever the file size.
+def summarize(dataset):
+    parquet_file = pq.ParquetFile(dataset.storage_path)
+    empty = parquet_file.schema_arrow.empty_table().to_pandas()
+    names = list(empty.columns)
+    columns_info = {name: (str(empty[name].dtype), column_kind(empty[name])) for name in names}
+
+    numeric_names = [name for name in names if columns_info[name][1] == "numeric"]
+    datetime_names = [name for name in names if pd.api.types.is_datetime64_any_dtype(empty[name])]
+    categorical_names = [name for name in names if columns_info[name][1] != "numeric"]
+    positions = {name: position for position, name in enumerate(parquet_file.schema_arrow.names)}
+
+    numeric = {name: NumericColumn() for name in numeric_names}
+    datetimes = {name: NumericColumn() for name in datetime_names}
+    categorical = {name: CategoricalColumn() for name in categorical_names}
+    null_counts = dict.fromkeys(names, 0)
+    co_moments = sketches.CoMoments(len(numeric_names))
+
+    known, lows, highs = statistics_ranges(parquet_file, numeric_names)
+    lows, highs = charts.histogram_range(lows, highs)
+    binned = np.flatnonzero(known)
+    bin_counts = np.zeros((len(binned), charts.HISTOGRAM_BINS), dtype=np.int64)
+    edges = np.linspace(lows[binned], highs[binned], charts.HISTOGRAM_BINS + 1, axis=1)
+
+    head = None
+    row_count = 0
+    for batch in batches(parquet_file):
+        if head is None:
+            head = batch.slice(0, 5).to_pandas()
+        row_count += batch.num_rows
+
+        if numeric_names:
+            values = np.column_stack([float_values(batch.column(positions[name])) for name in numeric_names])
+            for position, name in enumerate(numeric_names):
+                null_counts[name] += int(np.isnan(values[:, position]).sum())
+                numeric[name].update(values[:, position])
+            co_moments.update(values)
+            if len(binned):
+                counts, _ = charts.bin_counts(values[:, binned], lows[binned], highs[binned])
+                bin_counts += counts
+
+        for name in categorical_names:
+            array = batch.column(positions[name])
+            null_counts[name] += array.null_count
+            categorical[name].update(array)
+            if name in datetimes:
+                datetimes[name].update(datetime_values(array))
+
+    if head is None:
+        head = empty
+
+    described = {}
+    histograms = {}
+    for position, name in enumerate(numeric_names):
+        described[name] = numeric[name].describe()
+        if known[position]:
+            row = np.searchsorted(binned, position)
+            histograms[name] = (bin_counts[row], edges[row])
+        else:
+            histograms[name] = numeric[name].estimated_histogram()
+    for name in categorical_names:
+        described[name] = categorical[name].describe()
+    for name in datetime_names:
+        # Same stats as describe() gives datetimes: no std, values as Timestamps
+        tz = empty[name].dt.tz
+        stats = datetimes[name].describe()
+        stats.pop("std", None)
+        described[name] = {
+            stat: value if stat == "count" else pd.Timestamp(int(round(value)), tz=tz)
+            for stat, value in stats.items()
+        }
+        described[name]["count"] = categorical[name].count
+
+    correlation = None
+    if len(numeric_names) >= 2:
+        correlation = ([str(name) for name in numeric_names], co_moments.correlation())
+
+    return {
+        "shape": (row_count, len(names)),
+        "columns_info": columns_info,
+        "described": described,
+        "null_counts": null_counts,
+        "histograms": histograms,
+        "top_values": {name: categorical[name].top() for name in categorical_names},
+        "correlation": correlation,
+        "head": head
+    }
+
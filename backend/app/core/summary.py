@@ -0,0 +1,174 @@
+import os
+import re
+import warnings
+
+import numpy as np
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "2000"))
+SAMPLE_ROWS = 5
+SAMPLE_COLUMNS = 20
+TOP_CORRELATIONS = 10
+MIN_CORRELATION = 0.5
+VALUE_CHARS = 24
+
+# Rough Llama-style token count: numbers split into 3-digit pieces, words
+# and punctuation count as one token each. Close enough to budget against
+# without shipping a tokenizer.
+TOKEN_PATTERN = re.compile(r"\d{1,3}|[^\W\d_]+|[^\w\s]|_")
+
+
+def estimate_tokens(text):
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def short(value, limit=VALUE_CHARS):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = f"{value:.4g}"
+    text = str(value).replace("\n", " ").replace("|", "/")
+    return text if len(text) <= limit else text[:limit - 1] + "~"
+
+
+def strongest_correlations(profile):
+    correlation_data = profile["correlation"]
+    if correlation_data is None:
+        return {}, []
+
+    labels = correlation_data["labels"]
+    matrix = np.abs(np.array(correlation_data["matrix"], dtype=float))
+    np.fill_diagonal(matrix, np.nan)
+    with warnings.catch_warnings():
+        # All-NaN rows belong to constant columns
+        warnings.simplefilter("ignore", RuntimeWarning)
+        best = np.nanmax(matrix, axis=1)
+    strongest = {name: value for name, value in zip(labels, best) if not np.isnan(value)}
+
+    rows, columns = np.triu_indices(len(labels), k=1)
+    scores = np.nan_to_num(matrix[rows, columns], nan=0.0)
+    order = np.argsort(-scores, kind="stable")[:TOP_CORRELATIONS]
+    pairs = [
+        (labels[rows[i]], labels[columns[i]], correlation_data["matrix"][rows[i]][columns[i]])
+        for i in order if scores[i] >= MIN_CORRELATION
+    ]
+    return strongest, pairs
+
+
+# Columns most worth the model's attention first: ones with missing values,
+# strong correlations or few distinct categories. Ties keep file order.
+def rank_columns(profile):
+    strongest, _ = strongest_correlations(profile)
+    row_count = max(profile["row_count"], 1)
+
+    scores = []
+    for position, column in enumerate(profile["columns"]):
+        score = 2 * column["null_count"] / row_count
+        correlation = strongest.get(column["name"], 0)
+        if correlation >= MIN_CORRELATION:
+            score += correlation
+        unique = column["stats"].get("unique")
+        if column["kind"] == "categorical" and unique is not None and unique <= 50:
+            score += 0.25
+        scores.append((-score, position, column["name"]))
+    return [name for _, _, name in sorted(scores)]
+
+
+def column_line(column):
+    stats = column["stats"]
+    if column["kind"] == "numeric":
+        keys = ["mean", "std", "min", "25%", "50%", "75%", "max"]
+    else:
+        keys = ["unique", "top", "freq"]
+    values = ",".join(f"{key}={short(stats[key])}" for key in keys if key in stats)
+    return f"{short(column['name'], 40)}|{column['dtype']}|{column['null_count']}|{values}"
+
+
+def sample_lines(head, names):
+    names = [name for name in names if name in head.columns]
+    if not names:
+        return []
+    lines = [",".join(short(name, 40) for name in names)]
+    for row in head[names].itertuples(index=False):
+        lines.append(",".join(short(value, 16) for value in row))
+    return lines
+
+
+# Aggregate line for the columns left out, with as many example names as
+# fit in `room` tokens; None when not even the counts fit
+def omitted_line(omitted, room):
+    numeric = sum(1 for column in omitted if column["kind"] == "numeric")
+    missing = sum(column["null_count"] for column in omitted)
+    line = (
+        f"Omitted {len(omitted)} columns ({numeric} numeric, {len(omitted) - numeric} categorical, "
+        f"{missing} missing values)"
+    )
+    for count in range(min(len(omitted), 5), 0, -1):
+        candidate = line + ", e.g. " + ", ".join(short(column["name"], 20) for column in omitted[:count])
+        if estimate_tokens(candidate) <= room:
+            return candidate
+    return line if estimate_tokens(line) <= room else None
+
+
+# Builds the LLM context for a dataset from its stored profile within
+# `budget` estimated tokens. Column stats go in ranked order as one
+# pipe-separated line each; strong correlations and sample rows are added
+# while they fit, and columns left out are aggregated in a closing line.
+# Returns (text, estimated_tokens).
+def build_summary(profile, head=None, budget=SUMMARY_TOKEN_BUDGET):
+    columns = {column["name"]: column for column in profile["columns"]}
+    ranked = rank_columns(profile)
+    _, pairs = strongest_correlations(profile)
+
+    lines = [
+        f"Shape: {profile['row_count']} rows x {profile['column_count']} columns",
+        "Columns (name|dtype|missing|stats):"
+    ]
+    used = estimate_tokens("\n".join(lines))
+
+    # Room for the closing line about omitted columns
+    reserve = 60 if len(ranked) > 1 else 0
+    included = []
+    for name in ranked:
+        line = column_line(columns[name])
+        cost = estimate_tokens(line)
+        if used + cost > budget - reserve:
+            break
+        lines.append(line)
+        included.append(name)
+        used += cost
+
+    omitted = [columns[name] for name in ranked[len(included):]]
+
+    correlation_lines = [
+        f"{short(x, 40)}~{short(y, 40)}={value:.2f}"
+        for x, y, value in pairs if x in included and y in included
+    ]
+    if correlation_lines:
+        section = ["Strong correlations:"]
+        for line in correlation_lines:
+            cost = estimate_tokens("\n".join(section + [line]))
+            if used + cost > budget - reserve:
+                break
+            section.append(line)
+        if len(section) > 1:
+            lines.extend(section)
+            used += estimate_tokens("\n".join(section))
+
+    if head is not None and len(head):
+        section = ["Sample rows:"]
+        for line in sample_lines(head, included):
+            cost = estimate_tokens("\n".join(section + [line]))
+            if used + cost > budget - reserve:
+                break
+            section.append(line)
+        if len(section) > 2:
+            lines.extend(section)
+            used += estimate_tokens("\n".join(section))
+
+    if omitted:
+        line = omitted_line(omitted, budget - used)
+        if line is not None:
+            lines.append(line)
+
+    text = "\n".join(lines)
+    return text, estimate_tokens(text)
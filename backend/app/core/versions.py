@@ -0,0 +1,384 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.db_config import get_database_connection
+from app.database import blobs, storage
+from app.core import workers
+from app.core.backends import backend
+from app.core.operations import apply_operations
+from app.core.profile import build_stored_profile, fetch_profile, save_profile
+from app import models
+
+import json
+import os
+
+router = APIRouter()
+
+# Versions kept behind the current one; older ones are folded into the base
+VERSION_HISTORY_LIMIT = int(os.getenv("VERSION_HISTORY_LIMIT", "20"))
+# Every n-th version along the history keeps its Parquet snapshot so a
+# replay never applies more than n-1 logged cleans
+VERSION_SNAPSHOT_EVERY = int(os.getenv("VERSION_SNAPSHOT_EVERY", "5"))
+
+
+# All version rows of a dataset by number. Datasets stored before version
+# history existed get their current version recorded as the base.
+async def load_versions(session, dataset):
+    result = await session.execute(
+        select(models.DatasetVersion).where(models.DatasetVersion.dataset_id == dataset.id)
+    )
+    rows = {row.version: row for row in result.scalars()}
+
+    version = dataset.version or 0
+    if version not in rows:
+        rows[version] = models.DatasetVersion(
+            dataset_id=dataset.id,
+            version=version,
+            parent_version=None,
+            operations=None,
+            storage_path=dataset.storage_path,
+            row_count=dataset.row_count,
+            column_count=dataset.column_count
+        )
+        session.add(rows[version])
+    return rows
+
+
+# Text uploads keep their table as CSV in the content column, which the
+# first clean clears. Their base is written to Parquet and committed before
+# that clean so the base version has a file undo can go back to.
+def write_text_base(dataset):
+    return storage.write_version(dataset, storage.read_dataframe(dataset), dataset.version)
+
+
+async def store_text_base(session, dataset):
+    if dataset.storage_path is not None or not dataset.content:
+        return
+    written = await workers.run_cpu(write_text_base, storage.ref(dataset))
+    storage.apply_version(dataset, written)
+    await load_versions(session, dataset)
+    await session.commit()
+
+
+# Numbers are never reused, so a version's file path and cache keys always
+# refer to the same content
+def next_version(rows):
+    return max(rows) + 1
+
+
+def add_version(session, dataset, rows, parent_version, operations, code, outliers=None, dedup=None):
+    rows[dataset.version] = models.DatasetVersion(
+        dataset_id=dataset.id,
+        version=dataset.version,
+        parent_version=parent_version,
+        operations=json.dumps({"operations": operations, "code": code, "outliers": outliers, "dedup": dedup}),
+        storage_path=dataset.storage_path,
+        row_count=dataset.row_count,
+        column_count=dataset.column_count
+    )
+    session.add(rows[dataset.version])
+
+
+def lineage(rows, version):
+    chain = []
+    while version is not None:
+        chain.append(version)
+        version = rows[version].parent_version
+    return chain[::-1]
+
+
+# Whether a version can be checked out: it or an ancestor it is replayed
+# from has a file. Base rows of text datasets cleaned before their base
+# was stored have none.
+def restorable(rows, version):
+    while version is not None:
+        if rows[version].storage_path is not None:
+            return True
+        version = rows[version].parent_version
+    return False
+
+
+def redo_target(rows, version):
+    # After an undo and a new clean a version has several children; redo
+    # follows the most recent one
+    children = [child for child, row in rows.items() if row.parent_version == version]
+    return max(children) if children else None
+
+
+def redo_chain(rows, version):
+    chain = []
+    version = redo_target(rows, version)
+    while version is not None:
+        chain.append(version)
+        version = redo_target(rows, version)
+    return chain
+
+
+# Keyword arguments of apply_operations for a logged clean. Entries logged
+# before outlier treatments or dedup existed have no such keys.
+def logged_step(row):
+    entry = json.loads(row.operations)
+    return {
+        "operations": entry["operations"],
+        "code": entry["code"],
+        "outliers": entry.get("outliers"),
+        "dedup": entry.get("dedup")
+    }
+
+
+# Runs on a compute worker: replays logged cleans (version, step) on top of
+# a snapshot and writes the result as `version`. Also returns the sandbox
+# report of every replayed step that ran AI code.
+def replay(source, steps, version):
+    df = backend.read(source, copy=True)
+    executions = []
+    for step_version, step in steps:
+        df, report = apply_operations(df, **step)
+        if "code_execution" in report:
+            executions.append({"version": step_version, "code_execution": report["code_execution"]})
+    return backend.write(source, df, version), executions
+
+
+# Makes sure a version has a Parquet file, replaying it from the closest
+# materialized ancestor when compaction dropped its snapshot. Sandbox
+# reports of replayed AI code are appended to `executions` when given.
+async def materialize(dataset, rows, version, executions=None):
+    row = rows[version]
+    if row.storage_path is not None or row.parent_version is None:
+        return row
+
+    steps = []
+    source = row
+    while source.storage_path is None and source.parent_version is not None:
+        steps.append((source.version, logged_step(source)))
+        source = rows[source.parent_version]
+    source_ref = storage.DatasetRef(dataset.id, source.version, source.storage_path, "")
+
+    written, replayed = await workers.run_cpu(replay, source_ref, steps[::-1], version)
+    row.storage_path = written["storage_path"]
+    if executions is not None:
+        executions.extend(replayed)
+    return row
+
+
+def checkout(dataset, row):
+    storage.apply_version(dataset, {
+        "version": row.version,
+        "storage_path": row.storage_path,
+        "row_count": row.row_count,
+        "column_count": row.column_count
+    })
+
+
+# Keeps history bounded after every change: drops branches nobody can reach
+# with undo/redo, folds versions beyond VERSION_HISTORY_LIMIT into a new
+# base and removes snapshots that can be replayed cheaply. Returns the
+# files to delete once the session is committed.
+async def compact(session, dataset, rows):
+    current = dataset.version
+    history = lineage(rows, current)
+
+    if len(history) > VERSION_HISTORY_LIMIT + 1:
+        history = history[-(VERSION_HISTORY_LIMIT + 1):]
+        base = await materialize(dataset, rows, history[0])
+        base.parent_version = None
+        base.operations = None
+
+    path = history + redo_chain(rows, current)
+    kept = set(path)
+    removed_files = []
+
+    dropped = [version for version in rows if version not in kept]
+    for version in dropped:
+        if rows[version].storage_path:
+            removed_files.append(rows[version].storage_path)
+        await session.delete(rows.pop(version))
+    if dropped:
+        for model in (models.ColumnProfile, models.DatasetProfile):
+            await session.execute(
+                delete(model).where(model.dataset_id == dataset.id, model.version.in_(dropped))
+            )
+
+    for position, version in enumerate(path):
+        row = rows[version]
+        keep_snapshot = position == 0 or version == current or position % VERSION_SNAPSHOT_EVERY == 0
+        if not keep_snapshot and row.storage_path:
+            removed_files.append(row.storage_path)
+            row.storage_path = None
+
+    # Base files shared with other uploads of the same file stay while used
+    return await blobs.release(session, removed_files)
+
+
+def version_summary(row, current):
+    entry = json.loads(row.operations) if row.operations else None
+    return {
+        "version": row.version,
+        "parent_version": row.parent_version,
+        "operations": entry["operations"] if entry else [],
+        "code": entry["code"] if entry else None,
+        "outliers": entry.get("outliers") if entry else None,
+        "dedup": entry.get("dedup") if entry else None,
+        "materialized": row.storage_path is not None,
+        "current": row.version == current,
+        "row_count": row.row_count,
+        "column_count": row.column_count,
+        "created_at": row.created_at
+    }
+
+
+async def get_dataset(session, dataset_id):
+    result = await session.execute(
+        select(models.Dataset).where(models.Dataset.id == dataset_id)
+    )
+    dataset = result.scalar_one_or_none()
+    if dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if dataset.storage_path is None:
+        raise HTTPException(status_code=400, detail="Dataset has no tabular versions")
+    return dataset
+
+
+async def move_to(session, dataset, rows, version):
+    if not restorable(rows, version):
+        raise HTTPException(status_code=400, detail=f"Version {version} has no stored data to go back to")
+    executions = []
+    row = await materialize(dataset, rows, version, executions)
+    checkout(dataset, row)
+    removed_files = await compact(session, dataset, rows)
+    await session.commit()
+    for path in removed_files:
+        storage.remove_file(path)
+    summary = version_summary(rows[version], dataset.version)
+    # Versions without a snapshot are rebuilt, rerunning their AI code
+    if executions:
+        summary["code_execution"] = executions
+    return summary
+
+
+@router.get("/dataset/{dataset_id}/versions")
+async def list_versions(
+    dataset_id: int,
+    database: AsyncSession = Depends(get_database_connection)
+):
+    dataset = await get_dataset(database, dataset_id)
+    rows = await load_versions(database, dataset)
+    await database.commit()
+
+    current = dataset.version
+    return {
+        "current": current,
+        "can_undo": rows[current].parent_version is not None and restorable(rows, rows[current].parent_version),
+        "can_redo": redo_target(rows, current) is not None,
+        "versions": [version_summary(rows[version], current) for version in sorted(rows)]
+    }
+
+
+@router.post("/dataset/{dataset_id}/undo")
+async def undo(
+    dataset_id: int,
+    database: AsyncSession = Depends(get_database_connection)
+):
+    dataset = await get_dataset(database, dataset_id)
+    rows = await load_versions(database, dataset)
+
+    target = rows[dataset.version].parent_version
+    if target is None:
+        raise HTTPException(status_code=400, detail="Nothing to undo")
+    return await move_to(database, dataset, rows, target)
+
+
+@router.post("/dataset/{dataset_id}/redo")
+async def redo(
+    dataset_id: int,
+    database: AsyncSession = Depends(get_database_connection)
+):
+    dataset = await get_dataset(database, dataset_id)
+    rows = await load_versions(database, dataset)
+
+    target = redo_target(rows, dataset.version)
+    if target is None:
+        raise HTTPException(status_code=400, detail="Nothing to redo")
+    return await move_to(database, dataset, rows, target)
+
+
+# Profile of any kept version; computed (and stored) on first use
+async def version_profile(session, dataset, rows, version):
+    row = rows[version]
+    version_ref = storage.DatasetRef(dataset.id, version, row.storage_path, "")
+    profile = await fetch_profile(session, version_ref)
+    if profile is not None:
+        return profile
+
+    row = await materialize(dataset, rows, version)
+    version_ref = storage.DatasetRef(dataset.id, version, row.storage_path, "")
+    profile = await workers.run_cpu(build_stored_profile, version_ref)
+    await save_profile(session, version_ref, profile)
+    return profile
+
+
+# Schema and statistics level diff built from stored profiles, plus the
+# logged operations leading from one version to the other
+@router.get("/dataset/{dataset_id}/diff")
+async def diff_versions(
+    dataset_id: int,
+    base: Optional[int] = Query(None, alias="from"),
+    target: Optional[int] = Query(None, alias="to"),
+    database: AsyncSession = Depends(get_database_connection)
+):
+    dataset = await get_dataset(database, dataset_id)
+    rows = await load_versions(database, dataset)
+
+    target = dataset.version if target is None else target
+    if target not in rows:
+        raise HTTPException(status_code=404, detail=f"Version not found: {target}")
+    if base is None:
+        base = rows[target].parent_version
+        if base is None:
+            raise HTTPException(status_code=400, detail="Version has no parent to compare with")
+    if base not in rows:
+        raise HTTPException(status_code=404, detail=f"Version not found: {base}")
+
+    base_profile = await version_profile(database, dataset, rows, base)
+    target_profile = await version_profile(database, dataset, rows, target)
+    await database.commit()
+
+    base_columns = {column["name"]: column for column in base_profile["columns"]}
+    target_columns = {column["name"]: column for column in target_profile["columns"]}
+
+    changed = []
+    for name, column in target_columns.items():
+        before = base_columns.get(name)
+        if before is None:
+            continue
+        if before["dtype"] != column["dtype"] or before["null_count"] != column["null_count"]:
+            changed.append({
+                "column": name,
+                "dtype": [before["dtype"], column["dtype"]],
+                "null_count": [before["null_count"], column["null_count"]]
+            })
+
+    base_history = lineage(rows, base)
+    target_history = lineage(rows, target)
+    if base in target_history:
+        steps = target_history[target_history.index(base) + 1:]
+        direction = "forward"
+    elif target in base_history:
+        steps = base_history[base_history.index(target) + 1:][::-1]
+        direction = "backward"
+    else:
+        steps = []
+        direction = "unrelated"
+
+    return {
+        "from": base,
+        "to": target,
+        "rows": [base_profile["row_count"], target_profile["row_count"]],
+        "columns_added": [name for name in target_columns if name not in base_columns],
+        "columns_removed": [name for name in base_columns if name not in target_columns],
+        "columns_changed": changed,
+        "direction": direction,
+        "steps": [version_summary(rows[version], dataset.version) for version in steps]
+    }
@@ -1,20 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db_config import get_database_connection
+from app.database import storage
+from app.database import export
+from app.core import charts
+from app.core import sampling
+from app.core import workers
+from app.core.EDA import exact_charts, run_phase, sse_event
+from app.core.profile import build_charts, build_scatter, load_profile, numeric_names
 from app import models
 
-import io
-import pandas as pd
+import asyncio
 import numpy as np
+from typing import Literal
 
 router = APIRouter()
 
 
+async def read_preview(dataset_ref, columns):
+    preview_df, _ = await workers.run_cpu(storage.read_page, dataset_ref, 0, 15, columns)
+    preview_df = preview_df.replace({np.nan: None})
+    return {
+        "columns": columns,
+        "rows": preview_df.values.tolist()
+    }
+
+
+# mode=sample returns charts of a sample of rows, scaled to the full
+# dataset with error margins, plus a "sample" entry describing it.
+# mode=progressive answers with server-sent events: "sample" (the sampled
+# response) as soon as it is ready, then "exact" once the exact charts
+# are; a failed phase sends "error" instead.
 @router.get("/dataset/{dataset_id}/visualize")
 async def get_visualize(
     dataset_id: int,
+    scatter_pairs: int = Query(charts.SCATTER_TOP_PAIRS, ge=0, le=100),
+    mode: Literal["exact", "sample", "progressive"] = "exact",
+    sample: dict = Depends(sampling.sample_options),
     db: AsyncSession = Depends(get_database_connection)
 ):
     d1 = await db.execute(
@@ -26,147 +51,77 @@ async def get_visualize(
     if dataset is None:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    try:
-        dataframe = pd.read_csv(io.StringIO(dataset.content))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Could not parse dataset: " + str(e))
-
-    preview_columns = dataframe.columns.tolist()[:5]
-    preview_df = dataframe[preview_columns].iloc[:15].replace({np.nan: None})
-    preview = {
-        "columns": preview_columns,
-        "rows": preview_df.values.tolist()
-    }
-
-    charts = []
-
-    for column_name in dataframe.columns:
-        column_data = dataframe[column_name]
+    dataset_ref = storage.ref(dataset)
+    if mode == "exact":
+        profile = await load_profile(db, dataset)
+        preview_columns = [column["name"] for column in profile["columns"]][:5]
+        pairs = charts.top_pairs(profile["correlation"], scatter_pairs)
+        return {
+            "preview": await read_preview(dataset_ref, preview_columns),
+            "charts": await workers.run_cpu(build_charts, dataset_ref, profile, pairs)
+        }
+
+    # The stored profile may not exist yet, so the preview takes the
+    # column names from the file
+    preview_columns = (await workers.run_cpu(storage.column_names, dataset_ref))[:5]
+    preview = await read_preview(dataset_ref, preview_columns)
+    if mode == "sample":
+        sampled = await workers.run_cpu(sampling.sampled_charts, dataset_ref, sample, scatter_pairs)
+        return {"preview": preview, "charts": sampled["charts"], "sample": sampled["sample"]}
+
+    async def events():
+        errors = {}
+        exact = asyncio.ensure_future(exact_charts(dataset, scatter_pairs))
+        sampled = await run_phase(
+            "sample", workers.run_cpu(sampling.sampled_charts, dataset_ref, sample, scatter_pairs), None, errors
+        )
+        if sampled is not None:
+            yield sse_event("sample", {"preview": preview, "charts": sampled["charts"], "sample": sampled["sample"]})
+        else:
+            yield sse_event("error", {"phase": "sample", "detail": errors["sample"]})
 
-        if pd.api.types.is_numeric_dtype(column_data):
-            clean_values = column_data.dropna()
+        charts_v = await run_phase("exact", exact, None, errors)
+        if charts_v is not None:
+            yield sse_event("exact", {"preview": preview, "charts": charts_v})
+        else:
+            yield sse_event("error", {"phase": "exact", "detail": errors["exact"]})
 
-            if len(clean_values) == 0:
-                continue
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-            histogram_values, bin_edges = np.histogram(clean_values, bins=10)
 
-            labels = []
-            for i in range(len(bin_edges) - 1):
-                left = round(bin_edges[i], 2)
-                right = round(bin_edges[i + 1], 2)
-                labels.append(str(left) + "-" + str(right))
+@router.get("/dataset/{dataset_id}/scatter")
+async def get_scatter(
+    dataset_id: int,
+    x: str,
+    y: str,
+    db: AsyncSession = Depends(get_database_connection)
+):
+    d1 = await db.execute(
+        select(models.Dataset).where(models.Dataset.id == dataset_id)
+    )
 
-            data_values = []
-            for value in histogram_values:
-                if pd.isna(value) or np.isinf(value):
-                    data_values.append(None)
-                else:
-                    data_values.append(int(value))
+    dataset = d1.scalar_one_or_none()
 
-            charts.append({
-                "type": "bar",
-                "title": "Histogram of " + column_name,
-                "labels": labels,
-                "data": data_values
-            })
+    if dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
 
-        else:
-            value_counts = column_data.value_counts().head(10)
-
-            if len(value_counts) == 0:
-                continue
-
-            labels = value_counts.index.astype(str).tolist()
-            raw_values = value_counts.values.tolist()
-
-            clean_values = []
-            for value in raw_values:
-                if pd.isna(value) or np.isinf(value):
-                    clean_values.append(None)
-                else:
-                    clean_values.append(int(value))
-
-            charts.append({
-                "type": "bar",
-                "title": "Top categories in " + column_name,
-                "labels": labels,
-                "data": clean_values
-            })
-
-    numeric_columns = dataframe.select_dtypes(include=[np.number]).columns.tolist()
-
-    if len(numeric_columns) >= 2:
-        for i in range(len(numeric_columns)):
-            for j in range(i + 1, len(numeric_columns)):
-                col_x = numeric_columns[i]
-                col_y = numeric_columns[j]
-
-                pair_dataframe = dataframe[[col_x, col_y]].dropna()
-
-                if len(pair_dataframe) > 100:
-                    pair_dataframe = pair_dataframe.sample(n=100, random_state=42)
-
-                scatter_points = []
-                for _, row in pair_dataframe.iterrows():
-                    x_value = row[col_x]
-                    y_value = row[col_y]
-
-                    if pd.isna(x_value) or np.isinf(x_value):
-                        x_value = None
-                    else:
-                        x_value = float(x_value)
-
-                    if pd.isna(y_value) or np.isinf(y_value):
-                        y_value = None
-                    else:
-                        y_value = float(y_value)
-
-                    scatter_points.append({"x": x_value, "y": y_value})
-
-                charts.append({
-                    "type": "scatter",
-                    "title": "Scatter: " + col_x + " vs " + col_y,
-                    "labels": [],
-                    "data": scatter_points
-                })
-
-    if len(numeric_columns) >= 2:
-        correlation_matrix = dataframe[numeric_columns].corr()
-
-        matrix_data = []
-        for row_index in range(len(correlation_matrix.columns)):
-            column_name = correlation_matrix.columns[row_index]
-            row_values = correlation_matrix.iloc[row_index].values.tolist()
-
-            clean_row = []
-            for value in row_values:
-                if pd.isna(value) or np.isinf(value):
-                    clean_row.append(None)
-                else:
-                    clean_row.append(round(float(value), 3))
-
-            matrix_data.append({
-                "name": column_name,
-                "data": clean_row
-            })
-
-        charts.append({
-            "type": "matrix",
-            "title": "Correlation Matrix",
-            "labels": correlation_matrix.columns.tolist(),
-            "data": matrix_data
-        })
+    profile = await load_profile(db, dataset)
+    numeric_columns = numeric_names(profile)
+    for column_name in (x, y):
+        if column_name not in numeric_columns:
+            raise HTTPException(status_code=400, detail="Not a numeric column: " + column_name)
 
-    return {
-        "preview": preview,
-        "charts": charts
-    }
+    return await workers.run_cpu(build_scatter, storage.ref(dataset), x, y)
 
 
 @router.get("/dataset/{dataset_id}/download")
 async def download_dataset(
     dataset_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_database_connection)
 ):
     d1 = await db.execute(
@@ -178,9 +133,45 @@ async def download_dataset(
     if dataset is None:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    from fastapi.responses import Response
-    return Response(
-        content=dataset.content,
+    path = await workers.run_cpu(export.ensure_export, storage.ref(dataset))
+    size = path.stat().st_size
+    etag = f'"{dataset.id}-{dataset.version or 0}"'
+    headers = {
+        "Content-Disposition": "attachment; filename=cleaned_dataset.csv",
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Vary": "Accept-Encoding"
+    }
+
+    # A stale If-Range means the client's partial copy is from another version
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = export.parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                export.iter_file(path, start, end),
+                status_code=206,
+                media_type="text/csv",
+                headers=headers
+            )
+
+    encoding = export.choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(export.iter_file(path), media_type="text/csv", headers=headers)
+
+    headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        export.iter_compressed(path, encoding),
         media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=cleaned_dataset.csv"}
-    )
\ No newline at end of file
+        headers=headers
+    )
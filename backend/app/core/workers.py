@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# "thread" suits most loads since pandas, NumPy and Arrow release the GIL in
+# their heavy loops; "process" isolates pure-Python work such as type
+# inference. Process mode only changes run_cpu; run_blocking always uses
+# threads because its arguments (open files, ORM objects) cannot be pickled.
+# run_process always uses processes, for libraries that are not thread-safe.
+COMPUTE_EXECUTOR = os.getenv("COMPUTE_EXECUTOR", "thread")
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(min(4, os.cpu_count() or 1))))
+COMPUTE_CONCURRENCY = int(os.getenv("COMPUTE_CONCURRENCY", str(COMPUTE_WORKERS * 2)))
+
+cpu_executor = None
+process_executor = None
+thread_executor = None
+semaphore = None
+
+
+# HTTPException does not survive pickling, so errors cross the pool as this
+class WorkerHTTPError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def call(function, args, kwargs):
+    try:
+        return function(*args, **kwargs)
+    except HTTPException as e:
+        raise WorkerHTTPError(e.status_code, e.detail) from None
+
+
+def get_thread_executor():
+    global thread_executor
+    if thread_executor is None:
+        thread_executor = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="compute")
+    return thread_executor
+
+
+def get_cpu_executor():
+    global cpu_executor
+    if COMPUTE_EXECUTOR != "process":
+        return get_thread_executor()
+    if cpu_executor is None:
+        # spawn: forking a process that runs an event loop and DB threads is unsafe
+        cpu_executor = ProcessPoolExecutor(
+            max_workers=COMPUTE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return cpu_executor
+
+
+def get_process_executor():
+    global process_executor
+    if COMPUTE_EXECUTOR == "process":
+        return get_cpu_executor()
+    if process_executor is None:
+        process_executor = ProcessPoolExecutor(
+            max_workers=COMPUTE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return process_executor
+
+
+async def run_in(executor, function, args, kwargs):
+    global semaphore
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(COMPUTE_CONCURRENCY)
+    slots = semaphore
+    await slots.acquire()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, functools.partial(call, function, args, kwargs))
+
+    # A caller that stops waiting (a phase timeout, a closed connection)
+    # cannot stop a job that has started, so its slot is only given back
+    # once the executor is done with it; abandoned jobs stay counted
+    # instead of letting new ones pile up behind them
+    def release(done):
+        slots.release()
+        if not done.cancelled():
+            done.exception()
+
+    future.add_done_callback(release)
+    try:
+        return await asyncio.shield(future)
+    except WorkerHTTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+# CPU-bound pandas work; arguments and results must be picklable in process mode
+async def run_cpu(function, *args, **kwargs):
+    return await run_in(get_cpu_executor(), function, args, kwargs)
+
+
+# Work that has to leave this process whatever COMPUTE_EXECUTOR says
+async def run_process(function, *args, **kwargs):
+    return await run_in(get_process_executor(), function, args, kwargs)
+
+
+# Blocking work on objects that must stay in this process
+async def run_blocking(function, *args, **kwargs):
+    return await run_in(get_thread_executor(), function, args, kwargs)
+
+
+def shutdown():
+    global cpu_executor, process_executor, thread_executor
+    for executor in (cpu_executor, process_executor, thread_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    cpu_executor = None
+    process_executor = None
+    thread_executor = None
@@ -0,0 +1,89 @@
+# Content-addressed uploads: a file already parsed once is not parsed,
+# stored or profiled again. The upload's bytes are hashed while they sit
+# in the spooled temp file; a known hash gives the new dataset the first
+# upload's Parquet file as its base version and a copy of its profile.
+# Only tabular uploads are shared: text (plain text and PDFs) lives in
+# Dataset.content, which has no file to point at.
+import hashlib
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from app import models
+from app.core import workers
+from app.core.profile import build_stored_profile, fetch_profile, save_profile
+from app.database import storage
+
+
+def file_digest(file_stream):
+    file_stream.seek(0)
+    digest = hashlib.file_digest(file_stream, "sha256").hexdigest()
+    file_stream.seek(0)
+    return digest
+
+
+async def find_blob(session, digest, variant):
+    return await session.get(models.UploadBlob, (digest, variant))
+
+
+# Gives `dataset` the content of a known upload. False when the hash is
+# unknown or its source is gone: the caller then parses the file as usual.
+async def reuse(session, dataset, digest, variant):
+    blob = await find_blob(session, digest, variant)
+    if blob is None:
+        return False
+
+    if blob.storage_path is None or not Path(blob.storage_path).exists():
+        await session.delete(blob)
+        await session.flush()
+        return False
+
+    storage.apply_version(dataset, {
+        "version": (dataset.version or 0) + 1,
+        "storage_path": blob.storage_path,
+        "row_count": blob.row_count,
+        "column_count": blob.column_count
+    })
+    # Profiles of versions compacted away are deleted; recompute then
+    profile = await fetch_profile(session, storage.DatasetRef(blob.dataset_id, blob.version, blob.storage_path, ""))
+    if profile is None:
+        profile = await workers.run_cpu(build_stored_profile, storage.ref(dataset))
+    await save_profile(session, dataset, profile)
+    blob.ref_count = (blob.ref_count or 0) + 1
+    return True
+
+
+# Records a freshly parsed upload. A concurrent upload of the same file may
+# have registered it first; this one then simply owns its own copy.
+async def register(session, dataset, digest, variant):
+    if not dataset.storage_path:
+        return
+    await session.execute(insert(models.UploadBlob).values(
+        sha256=digest,
+        variant=variant,
+        dataset_id=dataset.id,
+        version=dataset.version or 0,
+        storage_path=dataset.storage_path,
+        row_count=dataset.row_count,
+        column_count=dataset.column_count,
+        ref_count=1
+    ).on_conflict_do_nothing())
+
+
+# Called with the files a commit is about to orphan: shared files lose a
+# reference instead and are only returned (for deletion) once unused
+async def release(session, paths):
+    if not paths:
+        return paths
+    result = await session.execute(
+        select(models.UploadBlob).where(models.UploadBlob.storage_path.in_(paths))
+    )
+    kept = set()
+    for blob in result.scalars():
+        blob.ref_count = (blob.ref_count or 1) - 1
+        if blob.ref_count > 0:
+            kept.add(blob.storage_path)
+        else:
+            await session.delete(blob)
+    return [path for path in paths if path not in kept]
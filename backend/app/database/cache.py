@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_BUDGET_MB = int(os.getenv("DATAFRAME_CACHE_MB", "512"))
+
+
+# Process-wide LRU of parsed DataFrames keyed by (dataset_id, version).
+# Cached frames are shared between requests, so callers must copy before
+# modifying them in place.
+class DataFrameCache:
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, dataframe):
+        size = int(dataframe.memory_usage(index=True, deep=True).sum())
+        if size > self.budget_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.used_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (dataframe, size)
+            self.used_bytes += size
+
+            while self.used_bytes > self.budget_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.used_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, dataset_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == dataset_id]:
+                self.used_bytes -= self.entries.pop(key)[1]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "used_bytes": self.used_bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+dataframe_cache = DataFrameCache(CACHE_BUDGET_MB * 1024 * 1024)
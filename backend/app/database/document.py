@@ -1,84 +1,209 @@
-import pymupdf
-import pandas as pd
+import os
+import shutil
+import tempfile
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from io import BytesIO
 from app import models
 from app.db_config import get_database_connection
+from app.database import blobs, excel, storage
+from app.database.pdf import read_pdf
+from app.core import workers
+from app.core.profile import build_stored_profile, save_profile
+from app.core import versions
 
 router = APIRouter()
 
 
-def read_pdf(file_bytes):
-    doc = pymupdf.open(stream=file_bytes, filetype="pdf")
-    text = ""
-    for page in doc:
-        page_text = page.get_text()
-        text += page_text + '\n'
-    doc.close()
-    doc_text = text.strip()
-    return doc_text
+# PDF workers open the document by path, so the upload gets a file of its own
+def save_temp(file_stream, suffix):
+    file_stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp:
+        shutil.copyfileobj(file_stream, temp)
+    return temp.name
 
-def read_excel(file_bytes):
+def store_excel(dataset, path, sheet):
     try:
-        file_stream = BytesIO(file_bytes)
-        df = pd.read_excel(file_stream)
-        text = df.to_csv(index=False)
-        return text
+        return excel.write_sheet(dataset, path, sheet)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail="Could not read Excel file.")
 
-def read_csv(file_bytes):
+def store_sheet(dataset, path, sheet):
+    return store_excel(dataset, path, sheet)[0]
+
+def read_csv(dataset, file_stream):
     try:
-        file_stream = BytesIO(file_bytes)
-        df = pd.read_csv(file_stream)
-        text = df.to_csv(index=False)
-        return text
+        return storage.write_csv_stream(dataset, file_stream)
     except Exception as e:
         raise HTTPException(status_code=400, detail="Could not read CSV file.")
 
+def upload_text(preview, content):
+    return preview.to_csv(index=False) if preview is not None else content
+
+# Checked before the upload's version is applied and before other datasets
+# are derived from it, so a rejected upload leaves no file behind
+def require_content(text, written):
+    if not text:
+        if written is not None:
+            storage.remove_file(written["storage_path"])
+        raise HTTPException(status_code=400, detail="File is empty")
+
+def upload_size(file):
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+# Another dataset from the same upload (a PDF table, a further Excel
+# sheet), stored and profiled like an uploaded CSV. `write` gets the new
+# dataset's ref and returns storage's written dict, or None when there is
+# no table, in which case nothing is kept.
+async def store_derived(db, username, name, write, *args):
+    dataset = models.Dataset(
+        username=username,
+        name=name[:255],
+        content="",
+        file_size=0,
+        status="ready"
+    )
+    db.add(dataset)
+    await db.flush()
+
+    written = await workers.run_blocking(write, storage.ref(dataset), *args)
+    if written is None:
+        await db.delete(dataset)
+        return None
+    storage.apply_version(dataset, written)
+    profile = await workers.run_cpu(build_stored_profile, storage.ref(dataset))
+    await save_profile(db, dataset, profile)
+    await versions.load_versions(db, dataset)
+    return {
+        "id": dataset.id,
+        "filename": dataset.name,
+        "row_count": dataset.row_count,
+        "column_count": dataset.column_count
+    }
+
 @router.post("/upload", status_code=status.HTTP_201_CREATED)
 async def upload_dataset(
     file: UploadFile = File(...),
     username: str = Form(...),
+    pdf_tables: bool = Form(False),
+    sheets: Optional[List[str]] = Form(None),
     db: AsyncSession = Depends(get_database_connection)
 ):
-    content = await file.read()
+    # The multipart parser has already spooled the body to a temp file,
+    # parse from there instead of pulling the whole upload into memory
+    source = file.file
+    source.seek(0)
 
     file_type = file.content_type
     Lfilename = file.filename.lower()
-    if Lfilename.endswith('.pdf'):
-        text = read_pdf(content)
-    elif Lfilename.endswith('.xlsx') or Lfilename.endswith('.xls'):
-        text = read_excel(content)
-    elif Lfilename.endswith('.csv'):
-        text = read_csv(content)
-    elif file_type == "text/plain" or Lfilename.endswith('.txt'):
-        decoded_text = content.decode("utf-8")
-        text = decoded_text
-    else:
+    is_pdf = Lfilename.endswith('.pdf')
+    is_excel = Lfilename.endswith('.xlsx') or Lfilename.endswith('.xls')
+    is_csv = Lfilename.endswith('.csv')
+    is_text = file_type == "text/plain" or Lfilename.endswith('.txt')
+    if not (is_pdf or is_excel or is_csv or is_text):
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    if not text:
-        raise HTTPException(status_code=400, detail="File is empty")
-    
     filename_parts = file.filename.split('.')
     file_ext = filename_parts[-1][:10]
 
+    digest = await workers.run_blocking(blobs.file_digest, source)
     dataset = models.Dataset(
         username=username,
         name=file.filename,
-        content=text,
-        file_size=len(content)
+        content="",
+        file_size=upload_size(file),
+        content_hash=digest,
+        status="ready"
     )
     db.add(dataset)
+    await db.flush()
+
+    # Tables go to Parquet, the content column only keeps free text.
+    # Parsing runs on worker threads so other requests keep being served.
+    # A table uploaded before is not parsed again (see blobs.reuse).
+    written = None
+    preview = None
+    variant = ""
+    reused = False
+    pdf_found = []
+    sheet_datasets = []
+    if is_pdf:
+        path = await workers.run_blocking(save_temp, source, ".pdf")
+        try:
+            dataset.content, pdf_found = await read_pdf(path, pdf_tables)
+        finally:
+            os.remove(path)
+    elif is_excel:
+        # Each selected sheet is a dataset; "*" imports all of them
+        path = await workers.run_blocking(save_temp, source, "." + file_ext.lower())
+        try:
+            selected = excel.select_sheets(await workers.run_blocking(excel.sheet_names, path), sheets)
+            if sheets:
+                dataset.name = f"{file.filename} ({selected[0]})"[:255]
+            variant = selected[0]
+            reused = await blobs.reuse(db, dataset, digest, variant)
+            if not reused:
+                written, preview = await workers.run_blocking(store_excel, storage.ref(dataset), path, selected[0])
+                require_content(upload_text(preview, ""), written)
+            for sheet in selected[1:]:
+                stored = await store_derived(db, username, f"{file.filename} ({sheet})", store_sheet, path, sheet)
+                if stored is not None:
+                    sheet_datasets.append(dict(stored, sheet=sheet))
+        finally:
+            os.remove(path)
+    elif is_csv:
+        reused = await blobs.reuse(db, dataset, digest, variant)
+        if not reused:
+            written, preview = await workers.run_blocking(read_csv, storage.ref(dataset), source)
+    else:
+        dataset.content = (await file.read()).decode("utf-8")
+
+    if reused and dataset.storage_path:
+        preview, _ = await workers.run_cpu(storage.read_page, storage.ref(dataset), 0, 20)
+    text = upload_text(preview, dataset.content)
+    require_content(text, written)
+    if written is not None:
+        storage.apply_version(dataset, written)
+
+    # Profile tables now so the first dashboard view is a metadata lookup
+    # (a reused upload already has the first upload's profile)
+    if dataset.storage_path:
+        if not reused:
+            profile = await workers.run_cpu(build_stored_profile, storage.ref(dataset))
+            await save_profile(db, dataset, profile)
+        # The upload is the base of the dataset's version history
+        await versions.load_versions(db, dataset)
+    if not reused:
+        await blobs.register(db, dataset, digest, variant)
+
+    tables = []
+    for first_page, last_page, table in pdf_found:
+        pages = f"page {first_page}" if first_page == last_page else f"pages {first_page}-{last_page}"
+        stored = await store_derived(db, username, f"{dataset.name} ({pages})", storage.write_version, table)
+        tables.append(dict(stored, first_page=first_page, last_page=last_page))
     await db.commit()
     
-    return {
+    response = {
         "id": dataset.id,
         "filename": dataset.name,
         "username": dataset.username,
         "file_size": dataset.file_size,
+        "row_count": dataset.row_count,
+        "column_count": dataset.column_count,
         "content_preview": text[:500],
+        "reused": reused,
         "created_at": dataset.created_at
     }
+    if pdf_tables:
+        response["tables"] = tables
+    if sheets:
+        first = {key: response[key] for key in ("id", "filename", "row_count", "column_count")}
+        response["sheets"] = [dict(first, sheet=selected[0])] + sheet_datasets
+    return response
@@ -0,0 +1,121 @@
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from app.database import storage
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(1024 * 1024)))
+
+
+# Next to the Parquet file, so it is removed with it; text datasets have
+# no file and export their content under the dataset's directory
+def export_path(dataset):
+    if dataset.storage_path:
+        return Path(dataset.storage_path).with_suffix(".csv")
+    return storage.STORAGE_DIR / str(dataset.id) / f"v{dataset.version or 0}.csv"
+
+
+# CSV exports are written once per version, so ranged requests can resume
+# against stable byte offsets and repeat downloads skip the conversion
+def ensure_export(dataset):
+    path = export_path(dataset)
+    if path.exists():
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            if not dataset.storage_path:
+                output.write(dataset.content.encode("utf-8"))
+            else:
+                parquet_file = pq.ParquetFile(dataset.storage_path)
+                header = True
+                for batch in parquet_file.iter_batches(batch_size=storage.ROW_GROUP_SIZE):
+                    batch.to_pandas().to_csv(output, index=False, header=header)
+                    header = False
+                if header:
+                    columns = parquet_file.schema_arrow.names
+                    pd.DataFrame(columns=columns).to_csv(output, index=False)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return path
+
+
+def parse_range(header, size):
+    # Only single byte ranges are honored; anything else gets the full body
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+
+    if start == "":
+        length = int(end)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        start = max(size - length, 0)
+        end = size - 1
+    else:
+        start = int(start)
+        end = size - 1 if end == "" else min(int(end), size - 1)
+
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = re.search(r"q=([0-9.]+)", params)
+        if quality and float(quality.group(1)) == 0:
+            continue
+        accepted.add(name.strip().lower())
+
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def iter_file(path, start=0, end=None):
+    with open(path, "rb") as source:
+        source.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            size = EXPORT_CHUNK_BYTES if remaining is None else min(EXPORT_CHUNK_BYTES, remaining)
+            chunk = source.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def iter_compressed(path, encoding):
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    for chunk in iter_file(path):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert
+
+from app.db_config import AsyncSessionLocal
+from app import models
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "50"))
+
+counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+
+def now():
+    return datetime.utcnow()
+
+
+def max_bytes():
+    return int(LLM_CACHE_MAX_MB * 1024 * 1024)
+
+
+def expiry_cutoff():
+    return now() - timedelta(hours=LLM_CACHE_TTL_HOURS)
+
+
+# The prompt already embeds the dataset context, so identical summaries and
+# instructions for the same model share one entry
+def cache_key(model, prompt):
+    payload = json.dumps([model, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get(key):
+    async with AsyncSessionLocal() as session:
+        entry = await session.get(models.LLMCacheEntry, key)
+        if entry is None:
+            counters["misses"] += 1
+            return None
+
+        if entry.created_at < expiry_cutoff():
+            await session.delete(entry)
+            await session.commit()
+            counters["expired"] += 1
+            counters["misses"] += 1
+            return None
+
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_used_at = now()
+        await session.commit()
+        counters["hits"] += 1
+        return entry.response
+
+
+async def put(key, model, response):
+    size = len(response.encode("utf-8"))
+    if size > max_bytes():
+        return
+
+    timestamp = now()
+    statement = insert(models.LLMCacheEntry).values(
+        key=key, model=model, response=response, size=size,
+        hit_count=0, created_at=timestamp, last_used_at=timestamp
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"response": response, "size": size, "created_at": timestamp, "last_used_at": timestamp}
+    )
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(statement)
+        await session.execute(
+            delete(models.LLMCacheEntry).where(models.LLMCacheEntry.created_at < expiry_cutoff())
+        )
+        await evict(session)
+        await session.commit()
+
+
+# Drops least recently used entries until the cache fits LLM_CACHE_MAX_MB
+async def evict(session):
+    total = await session.scalar(select(func.coalesce(func.sum(models.LLMCacheEntry.size), 0)))
+    if total <= max_bytes():
+        return
+
+    result = await session.execute(
+        select(models.LLMCacheEntry.key, models.LLMCacheEntry.size)
+        .order_by(models.LLMCacheEntry.last_used_at)
+    )
+    victims = []
+    for key, size in result:
+        if total <= max_bytes():
+            break
+        victims.append(key)
+        total -= size
+
+    await session.execute(delete(models.LLMCacheEntry).where(models.LLMCacheEntry.key.in_(victims)))
+    counters["evictions"] += len(victims)
+
+
+async def stats():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(
+                func.count(models.LLMCacheEntry.key),
+                func.coalesce(func.sum(models.LLMCacheEntry.size), 0),
+                func.coalesce(func.sum(models.LLMCacheEntry.hit_count), 0)
+            )
+        )
+        entries, used_bytes, stored_hits = result.one()
+
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "entries": entries,
+        "used_bytes": used_bytes,
+        "budget_bytes": max_bytes(),
+        "ttl_hours": LLM_CACHE_TTL_HOURS,
+        "hits": counters["hits"],
+        "misses": counters["misses"],
+        "expired": counters["expired"],
+        "evictions": counters["evictions"],
+        "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else None,
+        "lifetime_hits": stored_hits
+    }
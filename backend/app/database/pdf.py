@@ -0,0 +1,88 @@
+# PDF text and table extraction. Pages are split into ranges that worker
+# processes read from a file on disk, each opening the document once, and
+# the results are joined back in page order. PyMuPDF is not thread-safe,
+# so this always goes through workers.run_process, never threads.
+import asyncio
+import os
+
+import pandas as pd
+import pymupdf
+from fastapi import HTTPException
+
+from app.core import workers
+
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+
+
+def page_count(path):
+    with pymupdf.open(path) as document:
+        return document.page_count
+
+
+# Tables need a header and at least one row; column names are made unique
+# since Parquet cannot store two columns with the same name
+def table_frame(table):
+    frame = table.to_pandas()
+    if frame.empty:
+        return None
+    names = []
+    for position, name in enumerate(frame.columns):
+        name = str(name).strip() or f"column_{position + 1}"
+        while name in names:
+            name += "_"
+        names.append(name)
+    frame.columns = names
+    return frame
+
+
+# Runs in a worker process: the text of pages [start, stop) and, when
+# asked, the (page number, DataFrame) of each table found on them
+def extract_range(path, start, stop, tables=False):
+    texts = []
+    found = []
+    with pymupdf.open(path) as document:
+        for number in range(start, stop):
+            page = document[number]
+            texts.append(page.get_text())
+            if tables:
+                for table in page.find_tables().tables:
+                    frame = table_frame(table)
+                    if frame is not None:
+                        found.append((number + 1, frame))
+    return texts, found
+
+
+# A table continued on the next page repeats its header there: consecutive
+# pages with the same columns are one table
+def merge_tables(found):
+    merged = []
+    for page, frame in found:
+        if merged:
+            first_page, last_page, frames = merged[-1]
+            if page == last_page + 1 and list(frame.columns) == list(frames[-1].columns):
+                merged[-1] = (first_page, page, frames + [frame])
+                continue
+        merged.append((page, page, [frame]))
+    return merged
+
+
+# Text of the document and, with tables=True, its tables as
+# (first page, last page, DataFrame)
+async def read_pdf(path, tables=False):
+    try:
+        count = await workers.run_process(page_count, path)
+    except (pymupdf.FileDataError, RuntimeError):
+        raise HTTPException(status_code=400, detail="Could not read PDF file.")
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, count)) for start in range(0, count, PDF_PAGES_PER_TASK)]
+    parts = await asyncio.gather(*(
+        workers.run_process(extract_range, path, start, stop, tables) for start, stop in ranges
+    ))
+
+    text = "\n".join(page_text for texts, _ in parts for page_text in texts).strip()
+    found = [table for _, page_tables in parts for table in page_tables]
+    return text, [
+        (first_page, last_page, pd.concat(frames, ignore_index=True))
+        for first_page, last_page, frames in merge_tables(found)
+    ]
+
@@ -0,0 +1,372 @@
+import functools
+import io
+import os
+import uuid
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+from sqlalchemy import select, or_
+
+from app import models
+from app.db_config import AsyncSessionLocal
+from app.database.cache import dataframe_cache
+
+STORAGE_DIR = Path(os.getenv("DATASET_STORAGE_DIR", "data/datasets"))
+ROW_GROUP_SIZE = int(os.getenv("DATASET_ROW_GROUP_SIZE", "65536"))
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", str(ROW_GROUP_SIZE)))
+
+ARROW_TYPES = {
+    "int64": pa.int64(),
+    "float64": pa.float64(),
+    "bool": pa.bool_(),
+}
+
+# Uploads with these extensions are free text, not tables
+TEXT_EXTENSIONS = (".pdf", ".txt")
+
+
+# Picklable stand-in for a Dataset row, for work done off the event loop
+class DatasetRef(NamedTuple):
+    id: int
+    version: int
+    storage_path: Optional[str]
+    content: str
+
+
+def ref(dataset):
+    return DatasetRef(dataset.id, dataset.version or 0, dataset.storage_path, dataset.content or "")
+
+
+# The random part keeps two requests that picked the same version number
+# (concurrent cleans) from writing the same file; only the one whose
+# version row commits is referenced, the other removes its file
+def dataset_path(dataset_id, version):
+    return STORAGE_DIR / str(dataset_id) / f"v{version}-{uuid.uuid4().hex[:12]}.parquet"
+
+
+def to_arrow(dataframe):
+    # Parquet wants string column names and a single type per column
+    dataframe = dataframe.copy(deep=False)
+    dataframe.columns = [str(column) for column in dataframe.columns]
+    try:
+        return pa.Table.from_pandas(dataframe, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        for column in dataframe.columns:
+            if dataframe[column].dtype == object:
+                values = dataframe[column]
+                dataframe[column] = values.where(values.isna(), values.astype(str))
+        return pa.Table.from_pandas(dataframe, preserve_index=False)
+
+
+def next_version_path(dataset, version=None):
+    # Every write gets a new file, so readers of the previous version
+    # never see the new content under the old cache key
+    if version is None:
+        version = (dataset.version or 0) + 1
+    path = dataset_path(dataset.id, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return version, path
+
+
+# Writers only produce files and return what they wrote; apply_version
+# points the Dataset row at it, so writing can happen in a worker
+def finish_version(version, temp_path, path, row_count, column_count):
+    os.replace(temp_path, path)
+    return {
+        "version": version,
+        "storage_path": str(path),
+        "row_count": int(row_count),
+        "column_count": int(column_count)
+    }
+
+
+def apply_version(dataset, written):
+    dataset.storage_path = written["storage_path"]
+    dataset.content = ""
+    dataset.version = written["version"]
+    dataset.row_count = written["row_count"]
+    dataset.column_count = written["column_count"]
+    dataset.status = "ready"
+    dataframe_cache.invalidate(dataset.id)
+
+
+def write_table(dataset, table, version=None):
+    version, path = next_version_path(dataset, version)
+    temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+    pq.write_table(table, temp_path, row_group_size=ROW_GROUP_SIZE)
+    return finish_version(version, temp_path, path, table.num_rows, table.num_columns)
+
+
+def write_version(dataset, dataframe, version=None):
+    return write_table(dataset, to_arrow(dataframe), version)
+
+
+def write_dataframe(dataset, dataframe):
+    apply_version(dataset, write_version(dataset, dataframe))
+
+
+def merge_dtype(current, new):
+    if current is None or current == new:
+        return new
+    numeric = ("int64", "float64")
+    if current in numeric and new in numeric:
+        return "float64"
+    return "object"
+
+
+def csv_chunks(source, dtype=None):
+    source.seek(0)
+    return pd.read_csv(source, chunksize=CSV_CHUNK_ROWS, dtype=dtype)
+
+
+# Streams CSV from a seekable binary file into Parquet with bounded memory.
+# The first pass settles one dtype per column the way a full read_csv
+# would (int64 + float64 chunks -> float64, anything mixed -> object), the
+# second pass parses with those dtypes and appends each chunk as a row group.
+def write_csv_stream(dataset, source):
+    source.seek(0)
+    header = pd.read_csv(source, nrows=0)
+    columns = [str(column) for column in header.columns]
+
+    dtypes = dict.fromkeys(columns)
+    for chunk in csv_chunks(source):
+        for column, dtype in zip(columns, chunk.dtypes):
+            dtypes[column] = merge_dtype(dtypes[column], str(dtype))
+
+    read_dtypes = {}
+    fields = []
+    for position, column in enumerate(columns):
+        dtype = dtypes[column] or "object"
+        if dtype == "object":
+            read_dtypes[header.columns[position]] = str
+        else:
+            read_dtypes[header.columns[position]] = dtype
+        fields.append(pa.field(column, ARROW_TYPES.get(dtype, pa.string())))
+    schema = pa.schema(fields)
+
+    version, path = next_version_path(dataset)
+    temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    row_count = 0
+    preview = None
+
+    try:
+        with pq.ParquetWriter(temp_path, schema) as writer:
+            for chunk in csv_chunks(source, dtype=read_dtypes):
+                chunk.columns = columns
+                if preview is None:
+                    preview = chunk.head(20)
+                writer.write_table(
+                    pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                    row_group_size=ROW_GROUP_SIZE
+                )
+                row_count += len(chunk)
+            if preview is None:
+                writer.write_table(schema.empty_table())
+    except Exception:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+    written = finish_version(version, temp_path, path, row_count, len(columns))
+    if preview is None:
+        preview = pd.DataFrame(columns=columns)
+    return written, preview
+
+
+# Called once the new version is committed, never before, or for the file
+# of a version that failed to commit. Also drops the CSV export cached
+# next to the Parquet file.
+def remove_file(path):
+    if path:
+        Path(path).unlink(missing_ok=True)
+        Path(path).with_suffix(".csv").unlink(missing_ok=True)
+
+
+def cache_key(dataset):
+    return (dataset.id, dataset.version or 0)
+
+
+# The returned frame may be shared through the cache: copy before mutating
+def read_dataframe(dataset, columns=None):
+    key = cache_key(dataset)
+    cached = dataframe_cache.get(key)
+
+    try:
+        if cached is not None:
+            return cached if columns is None else cached[columns]
+
+        if dataset.storage_path:
+            if columns is not None:
+                # Projected reads skip the cache, they are cheap in Parquet
+                return pq.read_table(dataset.storage_path, columns=columns).to_pandas()
+            dataframe = pq.read_table(dataset.storage_path).to_pandas()
+        else:
+            # Rows that were never migrated still hold CSV text
+            dataframe = pd.read_csv(io.StringIO(dataset.content))
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not parse dataset: " + str(e)
+        )
+
+    dataframe_cache.put(key, dataframe)
+    if columns is not None:
+        try:
+            return dataframe[columns]
+        except KeyError as e:
+            raise HTTPException(status_code=400, detail="Unknown columns: " + str(e))
+    return dataframe
+
+
+def column_names(dataset):
+    if dataset.storage_path:
+        return pq.ParquetFile(dataset.storage_path).schema_arrow.names
+    return read_dataframe(dataset).columns.tolist()
+
+
+# Cumulative row offsets of each row group: starts[i] is the first row of
+# group i and starts[-1] the total. Paths are per version, so never stale.
+@functools.lru_cache(maxsize=256)
+def row_group_starts(path):
+    metadata = pq.ParquetFile(path).metadata
+    counts = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+
+
+def read_rows(dataset, positions, columns=None):
+    starts = row_group_starts(dataset.storage_path)
+    groups = np.searchsorted(starts, positions, side="right") - 1
+    needed = np.unique(groups)
+
+    table = pq.ParquetFile(dataset.storage_path).read_row_groups(needed.tolist(), columns=columns)
+
+    # Map global row numbers to offsets inside the concatenated groups
+    sizes = starts[needed + 1] - starts[needed]
+    table_starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    group_index = np.searchsorted(needed, groups)
+    local = table_starts[group_index] + (positions - starts[needed][group_index])
+    return table.take(local).to_pandas()
+
+
+# Rows at sorted positions spread over the whole file, read one row group
+# at a time so only the picked rows are held in memory
+def read_scattered_rows(dataset, positions, columns=None):
+    starts = row_group_starts(dataset.storage_path)
+    parquet_file = pq.ParquetFile(dataset.storage_path)
+    groups = np.searchsorted(starts, positions, side="right") - 1
+    bounds = np.searchsorted(groups, np.arange(len(starts)))
+
+    tables = [
+        parquet_file.read_row_group(int(group), columns=columns).take(
+            positions[bounds[group]:bounds[group + 1]] - starts[group]
+        )
+        for group in np.unique(groups)
+    ]
+    if not tables:
+        return pd.DataFrame(columns=columns or parquet_file.schema_arrow.names)
+    return pa.concat_tables(tables).to_pandas()
+
+
+# Rows of up to `groups` randomly picked row groups, for charts on files
+# too large to read whole
+def read_sample(dataset, columns, groups):
+    parquet_file = pq.ParquetFile(dataset.storage_path)
+    count = parquet_file.metadata.num_row_groups
+    picked = np.sort(np.random.default_rng(42).choice(count, min(groups, count), replace=False))
+    return parquet_file.read_row_groups(picked.tolist(), columns=columns).to_pandas()
+
+
+# Randomly picked row groups, in file order: at least `groups` of them and
+# as many more as it takes to hold `rows` rows
+def pick_row_groups(path, rows, groups, rng):
+    sizes = np.diff(row_group_starts(path))
+    order = rng.permutation(len(sizes))
+    covering = int(np.searchsorted(np.cumsum(sizes[order]), rows)) + 1
+    return np.sort(order[:max(groups, covering)])
+
+
+def read_row_groups(dataset, groups, columns=None):
+    return pq.ParquetFile(dataset.storage_path).read_row_groups(groups.tolist(), columns=columns).to_pandas()
+
+
+def sort_order(dataset, column, descending):
+    key = cache_key(dataset) + ("sort", column, descending)
+    cached = dataframe_cache.get(key)
+    if cached is not None:
+        return cached["position"].to_numpy()
+
+    values = read_dataframe(dataset, [column])[column].reset_index(drop=True)
+    try:
+        ordered = values.sort_values(ascending=not descending, kind="stable", na_position="last")
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail="Cannot sort by " + column + ": " + str(e))
+
+    order = ordered.index.to_numpy()
+    dataframe_cache.put(key, pd.DataFrame({"position": order}))
+    return order
+
+
+# Reads one page without loading the dataset: only the row groups holding
+# the requested rows and columns are decoded
+def read_page(dataset, offset, limit, columns=None, sort=None, descending=False):
+    names = column_names(dataset)
+    unknown = [column for column in (columns or []) + ([sort] if sort else []) if column not in names]
+    if unknown:
+        raise HTTPException(status_code=400, detail="Unknown columns: " + ", ".join(unknown))
+    columns = columns or names
+
+    cached = dataframe_cache.get(cache_key(dataset))
+    if cached is not None or not dataset.storage_path:
+        frame = cached if cached is not None else read_dataframe(dataset)
+        if sort:
+            positions = sort_order(dataset, sort, descending)[offset:offset + limit]
+            return frame[columns].iloc[positions], len(frame)
+        return frame[columns].iloc[offset:offset + limit], len(frame)
+
+    total_rows = int(row_group_starts(dataset.storage_path)[-1])
+    if sort:
+        positions = sort_order(dataset, sort, descending)[offset:offset + limit]
+    else:
+        positions = np.arange(offset, min(offset + limit, total_rows))
+
+    if len(positions) == 0:
+        return pd.DataFrame(columns=columns), total_rows
+    return read_rows(dataset, positions, columns), total_rows
+
+
+async def migrate_legacy_datasets():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(models.Dataset.id).where(
+                models.Dataset.storage_path.is_(None),
+                or_(models.Dataset.status.is_(None), models.Dataset.status == "pending")
+            )
+        )
+        dataset_ids = result.scalars().all()
+
+    migrated = 0
+    for dataset_id in dataset_ids:
+        # One row per session so only one CSV blob is in memory at a time
+        async with AsyncSessionLocal() as session:
+            dataset = await session.get(models.Dataset, dataset_id)
+
+            if dataset.name.lower().endswith(TEXT_EXTENSIONS):
+                dataset.status = "ready"
+            else:
+                try:
+                    dataframe = pd.read_csv(io.StringIO(dataset.content))
+                    write_dataframe(dataset, dataframe)
+                    migrated += 1
+                except Exception as e:
+                    print(f"Could not migrate dataset {dataset_id}: {e}")
+                    dataset.status = "ready"
+
+            await session.commit()
+
+    if dataset_ids:
+        print(f"Migrated {migrated} of {len(dataset_ids)} legacy datasets to Parquet")
@@ -1,3 +1,4 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
 DATABASE_URL = "sqlite+aiosqlite:///data/ml_engine.db"
@@ -5,11 +6,32 @@ DATABASE_URL = "sqlite+aiosqlite:///data/ml_engine.db"
 engine = create_async_engine(DATABASE_URL, echo=False)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+
+# create_all only creates missing tables, so columns added to existing
+# models are appended here for databases created by older versions
+def add_missing_columns(conn):
+    from app.models import Base
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            statement = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                statement += f" DEFAULT {getattr(default, 'text', default)}"
+            conn.execute(text(statement))
+
 async def init_db():
     from app.models import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
 
 async def get_database_connection():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -5,10 +5,16 @@ from fastapi.exceptions import RequestValidationError
 import traceback
 from app.db_config import init_db
 from app.api import auth
+from app.api import grok
 from app.database import document
+from app.database import storage
+from app.database.cache import dataframe_cache
+from app.database import llm_cache
 from app.core import EDA
 from app.core import clean
 from app.core import visualize
+from app.core import versions
+from app.core import workers
 app = FastAPI(
     title="Data Analysis: v1",
     description="Made by Yassine",
@@ -28,6 +34,7 @@ app.include_router(document.router, prefix="/api")
 app.include_router(EDA.router)
 app.include_router(clean.router)
 app.include_router(visualize.router)
+app.include_router(versions.router)
 
 
 @app.get("/health")
@@ -39,6 +46,14 @@ async def health_check():
     }
     return health_status
 
+@app.get("/cache/stats")
+async def cache_stats():
+    return dataframe_cache.stats()
+
+@app.get("/cache/llm/stats")
+async def llm_cache_stats():
+    return await llm_cache.stats()
+
 @app.get("/")
 async def root():
     root_info = {
@@ -66,6 +81,12 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.on_event("startup")
 async def startup():
      await init_db()
+     await storage.migrate_legacy_datasets()
+
+@app.on_event("shutdown")
+async def shutdown():
+     workers.shutdown()
+     await grok.close_client()
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
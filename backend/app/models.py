@@ -44,10 +44,13 @@ class Dataset(Base):
     name = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     file_path = Column(String(512), unique=True)
+    storage_path = Column(String(512))
+    version = Column(Integer, server_default=text("0"))
     status = Column(String(50), server_default=text("'pending'"))
     row_count = Column(Integer)
     column_count = Column(Integer)
     file_size = Column(Integer)
+    content_hash = Column(String(64))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     __table_args__ = (
@@ -57,3 +60,93 @@ class Dataset(Base):
     )
     
     user = relationship("User", back_populates="datasets")
+    column_profiles = relationship("ColumnProfile", back_populates="dataset", cascade="all, delete-orphan")
+    profiles = relationship("DatasetProfile", back_populates="dataset", cascade="all, delete-orphan")
+    versions = relationship("DatasetVersion", back_populates="dataset", cascade="all, delete-orphan")
+
+
+# Per-column statistics computed once per dataset version
+class ColumnProfile(Base):
+    __tablename__ = "column_profiles"
+
+    dataset_id = Column(Integer, ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    position = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    dtype = Column(String(50), nullable=False)
+    kind = Column(String(20), nullable=False)
+    null_count = Column(Integer, nullable=False)
+    stats = Column(Text, nullable=False)
+    histogram = Column(Text)
+    top_values = Column(Text)
+
+    dataset = relationship("Dataset", back_populates="column_profiles")
+
+# Dataset-wide part of the profile: head, shape and correlation matrix
+class DatasetProfile(Base):
+    __tablename__ = "dataset_profiles"
+
+    dataset_id = Column(Integer, ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    row_count = Column(Integer, nullable=False)
+    column_count = Column(Integer, nullable=False)
+    head = Column(Text, nullable=False)
+    correlation = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    dataset = relationship("Dataset", back_populates="profiles")
+
+# Version history of a dataset: a base snapshot followed by the clean
+# operations that produced each later version. storage_path is NULL when
+# the version is not materialized and has to be replayed from an ancestor.
+class DatasetVersion(Base):
+    __tablename__ = "dataset_versions"
+
+    dataset_id = Column(Integer, ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    parent_version = Column(Integer)
+    operations = Column(Text)
+    storage_path = Column(String(512))
+    row_count = Column(Integer)
+    column_count = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    dataset = relationship("Dataset", back_populates="versions")
+
+# Uploaded tables by SHA-256 of their bytes (plus the sheet for Excel), so
+# a re-upload shares the Parquet file and copies the profile of the dataset
+# that parsed it first. ref_count is the number of datasets whose version
+# history holds storage_path; the file goes when it drops to zero. Text
+# uploads have no file and are not recorded.
+class UploadBlob(Base):
+    __tablename__ = "upload_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    variant = Column(String(255), primary_key=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id", ondelete="SET NULL"))
+    version = Column(Integer)
+    storage_path = Column(String(512))
+    row_count = Column(Integer)
+    column_count = Column(Integer)
+    ref_count = Column(Integer, server_default=text("1"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_upload_blobs_storage_path", "storage_path"),
+    )
+
+# Cached LLM answers keyed by a SHA-256 of the model and full prompt
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String(100), nullable=False)
+    response = Column(Text, nullable=False)
+    size = Column(Integer, nullable=False)
+    hit_count = Column(Integer, server_default=text("0"))
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_llm_cache_last_used", "last_used_at"),
+    )
@@ -25,13 +25,92 @@ CREATE TABLE IF NOT EXISTS datasets (
     name TEXT NOT NULL,
     content TEXT NOT NULL,
     file_path TEXT UNIQUE,
+    storage_path TEXT,
+    version INTEGER DEFAULT 0,
     status TEXT DEFAULT 'pending',
     row_count INTEGER,
     column_count INTEGER,
     file_size INTEGER,
+    content_hash VARCHAR(64),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY(username) REFERENCES users(username) ON DELETE CASCADE
 );
 
 CREATE INDEX IF NOT EXISTS idx_datasets_username ON datasets(username);
 CREATE INDEX IF NOT EXISTS idx_datasets_status ON datasets(status);
+
+
+-- Per-column statistics computed once per dataset version
+CREATE TABLE IF NOT EXISTS column_profiles (
+    dataset_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    null_count INTEGER NOT NULL,
+    stats TEXT NOT NULL,
+    histogram TEXT,
+    top_values TEXT,
+    PRIMARY KEY (dataset_id, version, position),
+    FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON DELETE CASCADE
+);
+
+-- Dataset-wide profile: head, shape and correlation matrix
+CREATE TABLE IF NOT EXISTS dataset_profiles (
+    dataset_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    column_count INTEGER NOT NULL,
+    head TEXT NOT NULL,
+    correlation TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (dataset_id, version),
+    FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON DELETE CASCADE
+);
+
+-- Version history: a base snapshot plus the clean operations behind each
+-- later version; storage_path is NULL for versions replayed on demand
+CREATE TABLE IF NOT EXISTS dataset_versions (
+    dataset_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    parent_version INTEGER,
+    operations TEXT,
+    storage_path TEXT,
+    row_count INTEGER,
+    column_count INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (dataset_id, version),
+    FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON DELETE CASCADE
+);
+
+-- Uploaded tables by SHA-256 of their bytes (plus the sheet for Excel);
+-- ref_count is the number of datasets whose history holds storage_path
+CREATE TABLE IF NOT EXISTS upload_blobs (
+    sha256 VARCHAR(64) NOT NULL,
+    variant VARCHAR(255) NOT NULL,
+    dataset_id INTEGER,
+    version INTEGER,
+    storage_path TEXT,
+    row_count INTEGER,
+    column_count INTEGER,
+    ref_count INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sha256, variant),
+    FOREIGN KEY(dataset_id) REFERENCES datasets(id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_blobs_storage_path ON upload_blobs(storage_path);
+
+-- Cached LLM answers keyed by a SHA-256 of the model and full prompt
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP NOT NULL,
+    last_used_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at);
@@ -0,0 +1,112 @@
+# Compares the pandas and Polars execution backends on the work an upload
+# (profile) and a clean (item1-3, write, profile) do. Each backend runs in
+# its own process, configured through EXECUTION_BACKEND like a deployment.
+# Run from the backend directory: python -m perf.backends
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SHAPES = [(1_000_000, 1), (200_000, 5)]  # rows, copies of the 10 base columns
+BACKEND_NAMES = ["pandas", "polars"]
+OPERATIONS = ["item1", "item2", "item3"]
+
+
+def make_table(rows, copies):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    base = {
+        "amount": rng.normal(size=rows).round(3).astype(str),
+        "count": rng.integers(0, 1000, rows).astype(str),
+        "price": np.char.add("$", np.char.add(rng.integers(1, 99, rows).astype(str), ",200.50")),
+        "active": rng.choice(["Yes", "no"], rows),
+        "created_date": rng.choice(["2021-01-05", "2022-03-04", "2023-11-30"], rows),
+        "city": rng.choice([" Paris", "Rome ", "Oslo", "Lima"], rows),
+        "score": rng.normal(size=rows),
+        "rating": rng.integers(1, 6, rows).astype(float),
+        "income": rng.lognormal(10, 1, rows),
+        "segment": rng.choice(["a", "b", "c", "d", "e"], rows),
+    }
+    dataframe = pd.DataFrame({
+        f"{name}_{copy}": values.astype(object) if values.dtype.kind == "U" else values
+        for copy in range(copies) for name, values in base.items()
+    })
+    dataframe.iloc[::11, 0] = None
+    dataframe.iloc[::13, 7] = np.nan
+    # A share of exact duplicate rows for item2
+    return pd.concat([dataframe, dataframe.iloc[:rows // 20]], ignore_index=True)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+# Runs inside the per-backend process and prints "profile clean" seconds
+def run_backend(path):
+    from app.core.backends import backend
+    from app.core.operations import apply_operations
+    from app.core.profile import build_profile
+    from app.database import storage
+    from app.database.cache import dataframe_cache
+
+    source = storage.DatasetRef(1, 0, path, "")
+
+    def profile():
+        return build_profile(backend.read(source))
+
+    def clean():
+        frame, _ = apply_operations(backend.read(source, copy=True), OPERATIONS)
+        backend.write(source, frame, 1)
+        return build_profile(frame)
+
+    profile_seconds, _ = timed(profile)
+    dataframe_cache.invalidate(source.id)
+    clean_seconds, _ = timed(clean)
+    print(f"{profile_seconds} {clean_seconds}")
+
+
+def run_all():
+    from app.database import storage
+
+    print(f"CPUs: {os.cpu_count()}, operations: {', '.join(OPERATIONS)}\n")
+    print(f"  {'Rows':>10} {'Columns':>8} {'Backend':>8} {'Profile':>9} {'Clean':>9} {'Speedup':>16}")
+    print("  " + "─" * 66)
+
+    for rows, copies in SHAPES:
+        directory = tempfile.mkdtemp()
+        dataframe = make_table(rows, copies)
+        source = storage.DatasetRef(1, 0, None, "")
+        storage.STORAGE_DIR = storage.Path(directory)
+        path = storage.write_version(source, dataframe, 0)["storage_path"]
+
+        results = {}
+        for name in BACKEND_NAMES:
+            environment = dict(os.environ, EXECUTION_BACKEND=name, DATASET_STORAGE_DIR=directory)
+            output = subprocess.run(
+                [sys.executable, "-m", "perf.backends", path],
+                env=environment, capture_output=True, text=True
+            )
+            if output.returncode:
+                print(f"  {name}: failed\n{output.stderr}")
+                continue
+            results[name] = [float(value) for value in output.stdout.split()[-2:]]
+
+        baseline = results.get("pandas")
+        for name, (profile_seconds, clean_seconds) in results.items():
+            speedup = f"{baseline[0] / profile_seconds:.1f}x / {baseline[1] / clean_seconds:.1f}x" if baseline else "-"
+            print(
+                f"  {len(dataframe):>10,} {dataframe.shape[1]:>8} {name:>8} "
+                f"{profile_seconds:>8.2f}s {clean_seconds:>8.2f}s {speedup:>16}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_backend(sys.argv[1])
+    else:
+        run_all()
@@ -0,0 +1,121 @@
+# Compares the old per-column chart loops with app.core.charts on wide tables.
+# Run from the backend directory: python -m perf.charts
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core import charts
+
+ROWS = 100_000
+SHAPES = [10, 50, 100]  # numeric column counts
+CATEGORICAL_COLUMNS = 10
+
+
+def make_table(numeric_columns):
+    rng = np.random.default_rng(0)
+    data = {f"n{i}": rng.normal(size=ROWS) * (i + 1) for i in range(numeric_columns)}
+    for i in range(CATEGORICAL_COLUMNS):
+        data[f"c{i}"] = rng.choice(["red", "green", "blue", "cyan", "teal"], ROWS)
+    dataframe = pd.DataFrame(data)
+    dataframe.iloc[::17, 0] = np.nan
+    return dataframe
+
+
+# The chart code /analyze and /visualize used to run, kept for comparison
+def legacy_charts(dataframe):
+    result = []
+    for column_name in dataframe.columns:
+        column_data = dataframe[column_name]
+        if pd.api.types.is_numeric_dtype(column_data):
+            histogram_values, bin_edges = np.histogram(column_data.dropna(), bins=10)
+            labels = []
+            for i in range(len(bin_edges) - 1):
+                labels.append(str(round(bin_edges[i], 2)) + "-" + str(round(bin_edges[i + 1], 2)))
+            data_values = []
+            for value in histogram_values:
+                if pd.isna(value) or np.isinf(value):
+                    data_values.append(None)
+                else:
+                    data_values.append(int(value))
+            result.append({"type": "bar", "labels": labels, "data": data_values})
+        else:
+            value_counts = column_data.value_counts().head(10)
+            clean_values = []
+            for value in value_counts.values.tolist():
+                if pd.isna(value) or np.isinf(value):
+                    clean_values.append(None)
+                else:
+                    clean_values.append(int(value))
+            result.append({"type": "bar", "labels": value_counts.index.astype(str).tolist(), "data": clean_values})
+
+    numeric_columns = dataframe.select_dtypes(include=[np.number]).columns.tolist()
+    for i in range(len(numeric_columns)):
+        for j in range(i + 1, len(numeric_columns)):
+            pair_dataframe = dataframe[[numeric_columns[i], numeric_columns[j]]].dropna()
+            if len(pair_dataframe) > 100:
+                pair_dataframe = pair_dataframe.sample(n=100, random_state=42)
+            points = []
+            for _, row in pair_dataframe.iterrows():
+                x_value = row.iloc[0]
+                y_value = row.iloc[1]
+                x_value = None if pd.isna(x_value) or np.isinf(x_value) else float(x_value)
+                y_value = None if pd.isna(y_value) or np.isinf(y_value) else float(y_value)
+                points.append({"x": x_value, "y": y_value})
+            result.append({"type": "scatter", "data": points})
+
+    correlation_matrix = dataframe[numeric_columns].corr()
+    matrix_data = []
+    for row_index in range(len(correlation_matrix.columns)):
+        clean_row = []
+        for value in correlation_matrix.iloc[row_index].values.tolist():
+            if pd.isna(value) or np.isinf(value):
+                clean_row.append(None)
+            else:
+                clean_row.append(round(float(value), 3))
+        matrix_data.append(clean_row)
+    result.append({"type": "matrix", "data": matrix_data})
+    return result
+
+
+def vectorized_charts(dataframe):
+    numeric_columns = dataframe.select_dtypes(include=[np.number]).columns.tolist()
+    result = []
+
+    histograms = charts.histograms(dataframe[numeric_columns])
+    for column_name in dataframe.columns:
+        if column_name in histograms:
+            counts, edges = histograms[column_name]
+            result.append(charts.histogram_chart(column_name, counts, edges))
+        else:
+            labels, counts = charts.top_categories(dataframe[column_name])
+            result.append(charts.category_chart(column_name, labels, counts))
+
+    numeric_frame = dataframe[numeric_columns]
+    result.extend(charts.scatter_charts(numeric_frame))
+
+    labels, matrix = charts.correlation(numeric_frame)
+    result.append(charts.correlation_chart(labels, matrix))
+    return result
+
+
+def timed(function, dataframe):
+    start = time.perf_counter()
+    function(dataframe)
+    return time.perf_counter() - start
+
+
+def run_all():
+    print(f"Rows: {ROWS:,}, categorical columns: {CATEGORICAL_COLUMNS}\n")
+    print(f"  {'Numeric cols':>12} {'Legacy':>10} {'Vectorized':>11} {'Speedup':>8}")
+    print("  " + "─" * 44)
+
+    for numeric_columns in SHAPES:
+        dataframe = make_table(numeric_columns)
+        legacy = timed(legacy_charts, dataframe)
+        vectorized = timed(vectorized_charts, dataframe)
+        print(f"  {numeric_columns:>12} {legacy:>9.2f}s {vectorized:>10.2f}s {legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run_all()
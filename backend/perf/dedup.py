@@ -0,0 +1,89 @@
+# Peak memory and time of the duplicate report, which hashes the stored
+# file batch by batch, against loading the file and calling
+# drop_duplicates. Each run has its own process so peak RSS is per run.
+# Run from the backend directory: python -m perf.dedup
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROW_COUNTS = [1_000_000, 4_000_000]
+WRITE_CHUNK_ROWS = 1_000_000
+DUPLICATE_SHARE = 0.2
+
+
+def write_file(path, rows):
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from app.database import storage
+
+    rng = np.random.default_rng(0)
+    unique_rows = int(rows * (1 - DUPLICATE_SHARE))
+    writer = None
+    for start in range(0, rows, WRITE_CHUNK_ROWS):
+        size = min(WRITE_CHUNK_ROWS, rows - start)
+        # Row ids past unique_rows repeat earlier ones
+        ids = np.arange(start, start + size)
+        ids = np.where(ids < unique_rows, ids, rng.integers(0, unique_rows, size))
+        chunk = pa.table({
+            "id": ids,
+            "amount": (ids % 9973) / 7.0,
+            "segment": np.array(["a", "b", "c", "d", "e"])[ids % 5],
+            "user": np.char.add("user-", (ids % 100_003).astype(str)),
+        })
+        if writer is None:
+            writer = pq.ParquetWriter(path, chunk.schema)
+        writer.write_table(chunk, row_group_size=storage.ROW_GROUP_SIZE)
+    writer.close()
+
+
+# Runs inside the per-measurement process and prints
+# "seconds peak_mb duplicate_rows"
+def run_mode(path, mode):
+    from app.core import dedup
+    from app.database import storage
+
+    dataset = storage.DatasetRef(1, 0, path, "")
+    start = time.perf_counter()
+    if mode == "report":
+        duplicates = dedup.duplicate_report(dataset, None, "exact", 0.8, 10, 5)["duplicate_rows"]
+    else:
+        dataframe = storage.read_dataframe(dataset)
+        duplicates = len(dataframe) - len(dataframe.drop_duplicates())
+    seconds = time.perf_counter() - start
+    print(f"{seconds} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024} {duplicates}")
+
+
+def measure(path, mode):
+    output = subprocess.run([sys.executable, "-m", "perf.dedup", path, mode], capture_output=True, text=True)
+    if output.returncode:
+        print(output.stderr)
+        return None
+    seconds, peak, duplicates = output.stdout.split()[-3:]
+    return float(seconds), float(peak), int(duplicates)
+
+
+def run_all():
+    print(f"  {'Rows':>11} {'drop_duplicates':>24} {'Hashed report':>24} {'Same count':>11}")
+    print("  " + "─" * 74)
+
+    directory = tempfile.mkdtemp()
+    for rows in ROW_COUNTS:
+        path = os.path.join(directory, f"{rows}.parquet")
+        write_file(path, rows)
+        results = [measure(path, mode) for mode in ("pandas", "report")]
+        cells = [f"{result[0]:6.2f}s {result[1]:7.0f} MB" if result else "-" for result in results]
+        same = str(results[0][2] == results[1][2]) if all(results) else "-"
+        print(f"  {rows:>11,} {cells[0]:>24} {cells[1]:>24} {same:>11}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_mode(sys.argv[1], sys.argv[2])
+    else:
+        run_all()
@@ -0,0 +1,84 @@
+# Time and peak memory of an Excel upload's parse and Parquet write: the
+# old pd.read_excel + write_version against write_sheet with calamine and
+# with openpyxl's read-only mode. Each run has its own process so peak RSS
+# is per run. Writing the workbooks takes a while.
+# Run from the backend directory: python -m perf.excel
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROW_COUNTS = [200_000, 1_000_000]
+MODES = ["read_excel", "calamine", "openpyxl"]
+
+
+def write_file(path, rows):
+    import datetime
+
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data")
+    sheet.append(["id", "amount", "segment", "created", "active", "note"])
+    start = datetime.date(2020, 1, 1)
+    for row in range(rows):
+        sheet.append([
+            row, (row % 9973) / 7.0, "abcde"[row % 5], start + datetime.timedelta(days=row % 1500),
+            row % 3 == 0, None if row % 4 else f"note {row % 101}"
+        ])
+    workbook.save(path)
+
+
+# Runs inside the per-measurement process and prints
+# "seconds peak_mb rows"
+def run_mode(path, mode):
+    import pandas as pd
+
+    from app.database import excel, storage
+
+    storage.STORAGE_DIR = Path(tempfile.mkdtemp())
+    dataset = storage.DatasetRef(1, 0, None, "")
+    start = time.perf_counter()
+    if mode == "read_excel":
+        written = storage.write_version(dataset, pd.read_excel(path, engine="openpyxl"))
+    else:
+        excel.EXCEL_ENGINE = mode
+        written, _ = excel.write_sheet(dataset, path, "Data")
+    seconds = time.perf_counter() - start
+    print(f"{seconds} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024} {written['row_count']}")
+
+
+def measure(path, mode):
+    output = subprocess.run([sys.executable, "-m", "perf.excel", path, mode], capture_output=True, text=True)
+    if output.returncode:
+        print(output.stderr)
+        return None
+    seconds, peak, rows = output.stdout.split()[-3:]
+    return float(seconds), float(peak), int(rows)
+
+
+def run_all():
+    print(f"  {'Rows':>11} {'Mode':>11} {'Seconds':>9} {'Rows/s':>9} {'Peak':>9}")
+    print("  " + "─" * 54)
+
+    directory = tempfile.mkdtemp()
+    for rows in ROW_COUNTS:
+        path = os.path.join(directory, f"{rows}.xlsx")
+        write_file(path, rows)
+        for mode in MODES:
+            result = measure(path, mode)
+            if result is None:
+                continue
+            seconds, peak, written_rows = result
+            print(f"  {written_rows:>11,} {mode:>11} {seconds:>8.2f}s {written_rows / seconds:>9,.0f} {peak:>6.0f} MB")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_mode(sys.argv[1], sys.argv[2])
+    else:
+        run_all()
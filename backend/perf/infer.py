@@ -0,0 +1,104 @@
+# Compares the old per-value item1 type detection with app.core.infer.
+# Run from the backend directory: python -m perf.infer
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core import infer
+
+SHAPES = [(1_000_000, 1), (200_000, 10)]  # rows, copies of the 9 base columns
+
+
+def make_table(rows, copies):
+    rng = np.random.default_rng(0)
+    base = {
+        "amount": rng.normal(size=rows).round(3).astype(str),
+        "count": rng.integers(0, 1000, rows).astype(str),
+        "population": np.char.add(rng.integers(1, 99, rows).astype(str), ",000"),
+        "share": np.char.add(rng.integers(0, 100, rows).astype(str), "%"),
+        "price": np.char.add("$", np.char.add(rng.integers(1, 99, rows).astype(str), ",200.50")),
+        "active": rng.choice(["Yes", "no"], rows),
+        "created_date": rng.choice(["2021-01-05", "2022-03-04", "2023-11-30"], rows),
+        "city": rng.choice([" Paris", "Rome ", "Oslo"], rows),
+        "score": rng.normal(size=rows),
+    }
+    dataframe = pd.DataFrame({
+        f"{name}_{copy}": values.astype(object) if values.dtype.kind == "U" else values
+        for copy in range(copies) for name, values in base.items()
+    })
+    dataframe.iloc[::11, 0] = None
+    return dataframe
+
+
+# The item1 branch clean_dataset used to run, kept for comparison
+def legacy_item1(df):
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+
+        col_lower = col.lower()
+        sample = df[col].dropna().astype(str)
+
+        date_keywords = ["date", "time", "year", "month", "day", "created", "updated", "timestamp", "born", "founded"]
+        if any(word in col_lower for word in date_keywords):
+            converted = pd.to_datetime(df[col], errors='coerce')
+            if converted.notna().mean() >= 0.5:
+                df[col] = converted
+                continue
+
+        bool_map = {"true": True, "false": False, "yes": True, "no": False, "1": True, "0": False}
+        unique_vals = sample.str.lower().unique()
+        if all(v in bool_map for v in unique_vals) and len(unique_vals) <= 2:
+            df[col] = sample.str.lower().map(bool_map)
+            continue
+
+        def looks_numeric(val):
+            cleaned = str(val).strip().replace(',', '').replace(' ', '')
+            try:
+                float(cleaned)
+                return True
+            except ValueError:
+                return False
+
+        if sample.apply(looks_numeric).mean() >= 0.7:
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '').str.strip(), errors='coerce')
+            continue
+
+        if sample.str.strip().str.endswith('%').mean() >= 0.7:
+            df[col] = pd.to_numeric(sample.str.replace('%', '').str.strip(), errors='coerce')
+            continue
+
+        if sample.str.strip().str.match(r'^[\$\€\£\¥]?[\d,]+\.?\d*$').mean() >= 0.7:
+            df[col] = pd.to_numeric(
+                sample.str.replace(r'[\$\€\£\¥,]', '', regex=True).str.strip(),
+                errors='coerce'
+            )
+            continue
+
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str).str.strip()
+    return df
+
+
+def timed(function, dataframe):
+    start = time.perf_counter()
+    result = function(dataframe)
+    return time.perf_counter() - start, result
+
+
+def run_all():
+    print(f"Inference workers: {infer.INFER_WORKERS}, sample rows: {infer.INFER_SAMPLE_ROWS:,}\n")
+    print(f"  {'Rows':>10} {'Columns':>8} {'Legacy':>9} {'Sampled':>9} {'Speedup':>8} {'Same types':>11}")
+    print("  " + "─" * 60)
+
+    for rows, copies in SHAPES:
+        dataframe = make_table(rows, copies)
+        legacy, expected = timed(legacy_item1, dataframe.copy())
+        sampled, (result, _) = timed(infer.infer_types, dataframe)
+        same = (expected.dtypes == result.dtypes).all()
+        print(f"  {rows:>10,} {dataframe.shape[1]:>8} {legacy:>8.2f}s {sampled:>8.2f}s {legacy / sampled:>7.1f}x {str(same):>11}")
+
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,83 @@
+# Load test for app.api.grok against a local OpenAI-compatible stub that
+# sleeps like a real model and answers a share of requests with 429 or 503.
+# Run from the backend directory: python -m perf.llm
+import asyncio
+import os
+import random
+import threading
+import time
+
+STUB_PORT = 8765
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{STUB_PORT}")
+os.environ.setdefault("GROK_API_KEY", "stub")
+os.environ.setdefault("LLM_BACKOFF_BASE", "0.05")
+# Measure the client itself, not the response cache
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.api import grok
+
+CALLS = 200
+USERS = 5
+LATENCY = 0.05
+ERROR_RATE = 0.2
+
+stub = FastAPI()
+in_flight = {"now": 0, "peak": 0}
+
+
+@stub.post("/openai/v1/chat/completions")
+async def chat_completions():
+    in_flight["now"] += 1
+    in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+    try:
+        await asyncio.sleep(LATENCY)
+        roll = random.random()
+        if roll < ERROR_RATE / 2:
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429, headers={"retry-after": "0.05"})
+        if roll < ERROR_RATE:
+            return JSONResponse({"error": {"message": "overloaded"}}, status_code=503)
+        return {
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "[]"}}],
+        }
+    finally:
+        in_flight["now"] -= 1
+
+
+def start_stub():
+    server = uvicorn.Server(uvicorn.Config(stub, port=STUB_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run():
+    start = time.perf_counter()
+    answers = await asyncio.gather(
+        *(grok.ask_grok("context", "question", user=f"user{i % USERS}") for i in range(CALLS))
+    )
+    elapsed = time.perf_counter() - start
+    await grok.close_client()
+
+    errors = sum(1 for answer in answers if answer.startswith("Error:"))
+    print(f"Calls: {CALLS} from {USERS} users, stub latency {LATENCY * 1000:.0f}ms, error rate {ERROR_RATE:.0%}")
+    print(f"Limits: {grok.LLM_CONCURRENCY} global, {grok.LLM_USER_CONCURRENCY} per user, {grok.LLM_MAX_RETRIES} retries\n")
+    print(f"  Elapsed:        {elapsed:.2f}s ({CALLS / elapsed:.1f} calls/s)")
+    print(f"  Peak in flight: {in_flight['peak']}")
+    print(f"  Attempts:       {grok.llm_stats['requests']}")
+    print(f"  Retries:        {grok.llm_stats['retries']}")
+    print(f"  Failed calls:   {errors}")
+
+
+if __name__ == "__main__":
+    server = start_stub()
+    asyncio.run(run())
+    server.should_exit = True
@@ -0,0 +1,115 @@
+# Pages per second of PDF text extraction: the old one-page-at-a-time loop
+# against read_pdf's page ranges over a process pool of growing size, and
+# read_pdf with table detection. Each configuration runs in its own
+# process with COMPUTE_WORKERS set like a deployment; the pool is warmed
+# up first since the API keeps it between uploads.
+# Run from the backend directory: python -m perf.pdf
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGE_COUNTS = [100, 500]
+WORKER_COUNTS = [1, 2, 4]
+LINES_PER_PAGE = 45
+
+
+def write_file(path, pages):
+    import pymupdf
+
+    document = pymupdf.open()
+    for number in range(pages):
+        page = document.new_page()
+        text = "\n".join(
+            f"Line {line} of page {number}: revenue grew in region {line % 7} over the quarter"
+            for line in range(LINES_PER_PAGE)
+        )
+        page.insert_textbox(pymupdf.Rect(50, 50, 560, 560), text, fontsize=8)
+        # A small ruled table at the bottom of every fifth page
+        if number % 5 == 0:
+            for row in range(4):
+                for column in range(3):
+                    rect = pymupdf.Rect(72 + column * 120, 600 + row * 20, 72 + (column + 1) * 120, 620 + row * 20)
+                    page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                    label = ["Region", "Sales", "Growth"][column] if row == 0 else str(number * 10 + row * 3 + column)
+                    page.insert_text((rect.x0 + 3, rect.y1 - 6), label, fontsize=9)
+    document.save(path)
+
+
+def loop_text(path):
+    import pymupdf
+
+    doc = pymupdf.open(path)
+    text = ""
+    for page in doc:
+        text += page.get_text() + '\n'
+    doc.close()
+    return text.strip(), []
+
+
+# Runs inside the per-configuration process and prints
+# "seconds characters tables"
+def run_mode(path, mode):
+    from app.core import workers
+    from app.database.pdf import read_pdf
+
+    async def extract():
+        if mode == "loop":
+            start = time.perf_counter()
+            result = loop_text(path)
+            return time.perf_counter() - start, result
+        await read_pdf(path)  # starts the pool's processes
+        start = time.perf_counter()
+        result = await read_pdf(path, mode == "tables")
+        return time.perf_counter() - start, result
+
+    seconds, (text, tables) = asyncio.run(extract())
+    workers.shutdown()
+    print(f"{seconds} {len(text)} {len(tables)}")
+
+
+def measure(path, mode, worker_count):
+    environment = dict(os.environ, COMPUTE_WORKERS=str(worker_count))
+    output = subprocess.run(
+        [sys.executable, "-m", "perf.pdf", path, mode],
+        capture_output=True, text=True, env=environment
+    )
+    if output.returncode:
+        print(output.stderr)
+        return None
+    seconds, characters, tables = output.stdout.split()[-3:]
+    return float(seconds), int(characters), int(tables)
+
+
+def run_all():
+    print(f"  {os.cpu_count()} CPUs")
+    print(f"  {'Pages':>6} {'Mode':>8} {'Workers':>8} {'Seconds':>9} {'Pages/s':>9} {'Tables':>7} {'Same text':>10}")
+    print("  " + "─" * 64)
+
+    directory = tempfile.mkdtemp()
+    for pages in PAGE_COUNTS:
+        path = os.path.join(directory, f"{pages}.pdf")
+        write_file(path, pages)
+        baseline = measure(path, "loop", 1)
+        runs = [("loop", 1, baseline)]
+        runs += [("ranges", workers, measure(path, "ranges", workers)) for workers in WORKER_COUNTS]
+        runs += [("tables", workers, measure(path, "tables", workers)) for workers in WORKER_COUNTS]
+        for mode, workers, result in runs:
+            if result is None:
+                continue
+            seconds, characters, tables = result
+            same = baseline is not None and characters == baseline[1]
+            print(
+                f"  {pages:>6} {mode:>8} {workers:>8} {seconds:>8.2f}s "
+                f"{pages / seconds:>9.0f} {tables:>7} {str(same):>10}"
+            )
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_mode(sys.argv[1], sys.argv[2])
+    else:
+        run_all()
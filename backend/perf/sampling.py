@@ -0,0 +1,59 @@
+# Time to sampled charts versus exact charts (profile and charts) on
+# growing Parquet files, with the largest margin of error among the
+# sampled histogram bars. Run from the backend directory:
+# python -m perf.sampling
+import os
+import tempfile
+import time
+
+from perf.streaming import write_file
+
+ROW_COUNTS = [1_000_000, 4_000_000]
+SAMPLE_ROWS = [10_000, 100_000]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run_all():
+    from app.core import charts, sampling
+    from app.core.profile import build_charts, build_stored_profile
+    from app.database import storage
+    from app.database.cache import dataframe_cache
+
+    def exact(dataset):
+        profile = build_stored_profile(dataset)
+        return build_charts(dataset, profile, charts.top_pairs(profile["correlation"]))
+
+    print(f"  {'Rows':>11} {'Exact':>8} {'Sample':>9} {'Sampled':>9} {'Speedup':>8} {'Max error':>10}")
+    print("  " + "─" * 62)
+
+    directory = tempfile.mkdtemp()
+    for dataset_id, rows in enumerate(ROW_COUNTS):
+        path = os.path.join(directory, f"{rows}.parquet")
+        write_file(path, rows)
+        # Own id per file: the DataFrame cache is keyed by id and version
+        dataset = storage.DatasetRef(dataset_id, 0, path, "")
+
+        exact_seconds, _ = timed(exact, dataset)
+        for sample_rows in SAMPLE_ROWS:
+            # Sampled charts read the file, not the frame the exact run cached
+            dataframe_cache.invalidate(dataset.id)
+            options = {"rows": sample_rows, "fraction": None, "method": "reservoir", "stratify": None}
+            seconds, result = timed(sampling.sampled_charts, dataset, options)
+            error = max(
+                max(chart["error"]) / rows
+                for chart in result["charts"] if chart["type"] == "bar"
+            )
+            print(
+                f"  {rows:>11,} {exact_seconds:>7.2f}s {sample_rows:>9,} {seconds:>8.2f}s "
+                f"{exact_seconds / seconds:>7.1f}x {error:>9.2%}"
+            )
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    run_all()
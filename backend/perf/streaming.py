@@ -0,0 +1,87 @@
+# Peak memory and time of the in-memory and the streaming profile on
+# growing Parquet files. Each profile runs in its own process so peak RSS
+# is measured per run. Run from the backend directory: python -m perf.streaming
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROW_COUNTS = [1_000_000, 4_000_000, 16_000_000]
+IN_MEMORY_MAX_ROWS = 4_000_000  # larger files would not fit this box
+WRITE_CHUNK_ROWS = 1_000_000
+
+
+def write_file(path, rows):
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from app.database import storage
+
+    rng = np.random.default_rng(0)
+    writer = None
+    for start in range(0, rows, WRITE_CHUNK_ROWS):
+        size = min(WRITE_CHUNK_ROWS, rows - start)
+        chunk = pa.table({
+            "amount": rng.normal(size=size),
+            "income": rng.lognormal(10, 1, size),
+            "rating": rng.integers(1, 6, size),
+            "score": np.where(rng.random(size) < 0.1, np.nan, rng.normal(size=size)),
+            "segment": rng.choice(["a", "b", "c", "d", "e"], size),
+            "user": np.char.add("u", rng.integers(0, 1_000_000, size).astype(str)),
+        })
+        if writer is None:
+            writer = pq.ParquetWriter(path, chunk.schema)
+        writer.write_table(chunk, row_group_size=storage.ROW_GROUP_SIZE)
+    writer.close()
+
+
+# Runs inside the per-profile process and prints "seconds peak_mb"
+def run_profile(path, mode):
+    from app.core import profile, streaming
+    from app.database import storage
+
+    dataset = storage.DatasetRef(1, 0, path, "")
+    start = time.perf_counter()
+    if mode == "streaming":
+        profile.assemble_profile(**streaming.summarize(dataset))
+    else:
+        profile.build_profile(storage.read_dataframe(dataset))
+    seconds = time.perf_counter() - start
+    print(f"{seconds} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}")
+
+
+def measure(path, mode):
+    output = subprocess.run(
+        [sys.executable, "-m", "perf.streaming", path, mode], capture_output=True, text=True
+    )
+    if output.returncode:
+        return None
+    return [float(value) for value in output.stdout.split()[-2:]]
+
+
+def run_all():
+    print(f"  {'Rows':>11} {'File':>9} {'In memory':>20} {'Streaming':>20}")
+    print("  " + "─" * 64)
+
+    directory = tempfile.mkdtemp()
+    for rows in ROW_COUNTS:
+        path = os.path.join(directory, f"{rows}.parquet")
+        write_file(path, rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        cells = []
+        for mode in ("memory", "streaming"):
+            result = measure(path, mode) if mode == "streaming" or rows <= IN_MEMORY_MAX_ROWS else None
+            cells.append(f"{result[0]:6.1f}s {result[1]:7.0f} MB" if result else "-")
+        print(f"  {rows:>11,} {size_mb:>6.0f} MB {cells[0]:>20} {cells[1]:>20}")
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_profile(sys.argv[1], sys.argv[2])
+    else:
+        run_all()